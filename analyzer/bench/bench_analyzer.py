@@ -0,0 +1,210 @@
+"""
+Micro-benchmark dell'Analyzer, senza Influx ne' broker.
+
+Genera finestre di parametri vitali con la dinamica di Patient
+(managed_resources/src/patient.py), misura ogni fase dell'analisi ed il
+ciclo completo al variare della lunghezza della finestra e del numero di
+pazienti, e riporta throughput e latenze p50/p99.
+
+    python analyzer/bench/bench_analyzer.py
+    python analyzer/bench/bench_analyzer.py --windows 300 --patients 1,50 --save baseline.json
+    python analyzer/bench/bench_analyzer.py --compare baseline.json
+
+Con --compare termina con codice 1 se una fase e' piu' lenta della
+baseline salvata oltre --tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path[:0] = [str(ROOT), str(ROOT / "analyzer" / "src"), str(ROOT / "managed_resources" / "src")]
+
+# Variabili lette all'import da Patient e MQTTHandler (nessuna connessione viene aperta)
+os.environ.setdefault("FLUIDS_ADMINISTRATION_RATE", "3")
+os.environ.setdefault("MQTT_PORT", "1883")
+os.environ.setdefault("MQTT_CLIENT_KEEPALIVE", "180")
+# niente checkpoint ne' reload delle regole durante il benchmark
+os.environ.setdefault("ANALYZER_CHECKPOINT_SECONDS", "0")
+
+import numpy as np
+import pandas as pd
+
+from patient import Patient
+from analyzer import Analyzer
+from influx_handler import wide_from_csv, analyzer_frames
+import main as analyzer_main
+
+STAGES = ["pivot", "filter_EWMA", "calculate_trend", "calculate_slope", "generate_status", "cycle"]
+
+
+def simulate_wide(patient_id: int, seconds: int, end: pd.Timestamp) -> pd.DataFrame:
+    """Una finestra wide (indice time, colonne hr, rr, spo2, sbp, dbp) campionata ogni secondo"""
+    patient = Patient(patient_id)
+    rows = []
+    for _ in range(seconds):
+        patient.update_state()
+        # stessi arrotondamenti dei sensori
+        rows.append((
+            int(round(patient.get_heart_rate())),
+            int(round(patient.get_respiratory_rate())),
+            int(round(patient.get_oxygen_saturation())),
+            int(round(patient.get_systolic_blood_pressure())),
+            int(round(patient.get_diastolic_blood_pressure()))
+        ))
+
+    index = pd.date_range(end=end, periods=seconds, freq="1s", name="time")
+    return pd.DataFrame(rows, index=index, columns=["hr", "rr", "spo2", "sbp", "dbp"], dtype=float)
+
+
+def pivot_csv(wides: dict[int, pd.DataFrame]) -> str:
+    """CSV nel formato della query pivot di build_query, per tutti i pazienti"""
+    frames = []
+    for patient_id, wide in wides.items():
+        frame = wide.rename(columns={
+            "hr": "hr_value",
+            "rr": "rr_value",
+            "spo2": "spo2_value",
+            "sbp": "bp_value_sbp",
+            "dbp": "bp_value_dbp"
+        }).reset_index().rename(columns={"time": "_time"})
+        frame["_time"] = frame["_time"].dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        frame.insert(1, "patient_id", str(patient_id))
+        frames.append(frame)
+    return pd.concat(frames).to_csv(index=False)
+
+
+def timed(samples: dict, stage: str, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    samples[stage].append(time.perf_counter() - start)
+    return result
+
+
+def run_case(window_seconds: int, patients: int, repeats: int, seed: int) -> dict:
+    random.seed(seed)
+    end = pd.Timestamp.now(tz="UTC").floor("s")
+    wides = {p: simulate_wide(p, window_seconds, end) for p in range(1, patients + 1)}
+    csv = pivot_csv(wides)
+
+    frames = analyzer_frames({str(p): wide for p, wide in wides.items()})
+    analyzers = {}
+    for patient_id, frame in frames.items():
+        analyzers[patient_id] = Analyzer()
+        # initialize_baseline stampa lo storico
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyzers[patient_id].initialize_baseline(frame)
+        analyzers[patient_id].par_initialized = True
+
+    samples = {stage: [] for stage in STAGES}
+    ward = []
+    for _ in range(repeats):
+        ward_start = time.perf_counter()
+        timed(samples, "pivot", lambda: analyzer_frames(wide_from_csv(io.StringIO(csv))))
+
+        for patient_id, frame in frames.items():
+            analyzer = analyzers[patient_id]
+            filtered = timed(samples, "filter_EWMA", analyzer.filter_EWMA_rates, frame)
+            timed(samples, "calculate_trend", analyzer.calculate_trend, filtered["slow"])
+            timed(samples, "calculate_slope", analyzer.calculate_slope, frame, filtered["slow"], filtered["fast"])
+            agg = analyzer_main.compute_agg_from_raw(frame, window_seconds=60)
+            timed(samples, "generate_status", analyzer.generate_status, agg)
+            timed(samples, "cycle", analyzer_main.analyze, patient_id, analyzer, frame)
+        ward.append(time.perf_counter() - ward_start)
+
+    stages = {}
+    for stage, values in samples.items():
+        values = np.array(values)
+        stages[stage] = {
+            "p50_ms": float(np.percentile(values, 50) * 1e3),
+            "p99_ms": float(np.percentile(values, 99) * 1e3),
+            "per_s": float(len(values) / values.sum())
+        }
+
+    return {
+        "window_seconds": window_seconds,
+        "patients": patients,
+        "samples": int(len(next(iter(frames.values())))),
+        "stages": stages,
+        # pazienti analizzati al secondo, pivot compresa
+        "patients_per_s": float(patients * repeats / sum(ward))
+    }
+
+
+def case_key(case: dict) -> str:
+    return f"{case['window_seconds']}s/{case['patients']}p"
+
+
+def print_case(case: dict, reference: dict | None, tolerance: float) -> list[str]:
+    """Stampa un caso e restituisce le fasi piu' lente della baseline"""
+    print(f"\nwindow {case['window_seconds']}s ({case['samples']} samples), "
+          f"{case['patients']} patients: {case['patients_per_s']:.1f} patients/s")
+    print(f"  {'stage':<16}{'p50 ms':>10}{'p99 ms':>10}{'calls/s':>12}{'vs base':>10}")
+
+    regressions = []
+    for stage, result in case["stages"].items():
+        change = ""
+        if reference is not None and stage in reference["stages"]:
+            ratio = result["p50_ms"] / reference["stages"][stage]["p50_ms"]
+            change = f"{ratio:.2f}x"
+            if ratio > 1 + tolerance:
+                change += " !"
+                regressions.append(f"{case_key(case)} {stage}: p50 {ratio:.2f}x")
+        print(f"  {stage:<16}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['per_s']:>12.1f}{change:>10}")
+    return regressions
+
+
+def int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyzer micro-benchmark")
+    parser.add_argument("--windows", type=int_list, default=[60, 300, 900], help="window lengths in seconds")
+    parser.add_argument("--patients", type=int_list, default=[1, 10, 50], help="patient counts")
+    parser.add_argument("--repeats", type=int, default=20, help="analysis cycles per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", type=Path, help="write results as a JSON baseline")
+    parser.add_argument("--compare", type=Path, help="JSON baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare is not None:
+        baseline = {case_key(case): case for case in json.loads(args.compare.read_text())["cases"]}
+
+    cases = []
+    regressions = []
+    for window_seconds in args.windows:
+        for patients in args.patients:
+            case = run_case(window_seconds, patients, args.repeats, args.seed)
+            cases.append(case)
+            regressions += print_case(case, baseline.get(case_key(case)), args.tolerance)
+
+    if args.save is not None:
+        args.save.write_text(json.dumps({
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeats": args.repeats,
+            "cases": cases
+        }, indent=2))
+        print(f"\nSaved baseline to {args.save}")
+
+    if regressions:
+        print("\nSlower than baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
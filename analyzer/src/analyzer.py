@@ -3,7 +3,9 @@ import json
 import time
 from datetime import datetime
 from collections import deque
-from config_loader import CLINICAL_RULES
+from config_loader import current_rules
+from clinical_rules import ClinicalRules
+from rolling import RingBuffer, RollingQuantile, EWMVariance, RollingAggregator
 import pandas as pd
 import numpy as np
 
@@ -19,9 +21,57 @@ SLOPE_THRESHOLDS_5MIN = {
 
 METRICS = ["hr", "rr", "spo2", "sbp", "dbp", "map"]
 
+# Intervalli di alpha dei due filtri EWMA (lento e veloce)
+EWMA_RATES = {
+    "slow": (0.02, 0.1),
+    "fast": (0.2, 0.3),
+}
+
+# Lunghezza dei blocchi della scansione EWMA: limita l'underflow dei prodotti cumulati
+EWMA_SCAN_BLOCK = 32
+
+
+def time_varying_ewma(alpha, x, y0):
+    """
+    EWMA con alpha variabile, calcolata a blocchi senza loop per campione:
+
+        y_t = alpha_t * x_t + (1 - alpha_t) * y_{t-1}
+
+    In ogni blocco y_t = P_t * (y_prev + sum_k alpha_k * x_k / P_k), con
+    P_t = prod (1 - alpha_k). Richiede alpha < 1.
+
+    Args:
+        alpha: matrice (campioni x metriche) di alpha_t
+        x: matrice (campioni x metriche) dei valori
+        y0: valore iniziale per metrica
+    """
+    alpha = np.asarray(alpha, dtype=float)
+    x = np.asarray(x, dtype=float)
+    if np.any(alpha >= 1):
+        raise ValueError("time_varying_ewma richiede alpha < 1")
+
+    out = np.empty_like(x)
+    prev = np.asarray(y0, dtype=float)
+    for start in range(0, len(x), EWMA_SCAN_BLOCK):
+        a = alpha[start:start + EWMA_SCAN_BLOCK]
+        p = np.cumprod(1 - a, axis=0)
+        y = p * (prev + np.cumsum(a * x[start:start + EWMA_SCAN_BLOCK] / p, axis=0))
+        out[start:start + EWMA_SCAN_BLOCK] = y
+        prev = y[-1]
+    return out
+
+
+def adaptive_alpha(sigma_norm, g_norm, c_t, is_outlier, alpha_min, alpha_max, w1=1, w2=1, w3=1):
+    """Versione vettoriale della combinazione di calculate_alpha"""
+    s_t = (w1 * sigma_norm + w2 * g_norm + w3 * c_t) / (w1 + w2 + w3)
+    s_t = np.where(is_outlier, np.minimum(s_t * 1.5, 1.0), s_t)
+    return alpha_min + (alpha_max - alpha_min) * s_t
+
+
 class Analyzer:
     def __init__(self):
         """Initialize pipeline data"""
+        self.clock = time.time  # sorgente del tempo (epoch in secondi), virtuale nel replay
         self.hypoxia_starting_time = 0
         self.ox_therapy_monitoring = 600 #secondi
         self.hypoxia_status = ['LIGHT_HYPOXIA', 'GRAVE_HYPOXIA']
@@ -29,11 +79,24 @@ class Analyzer:
         self.EWMA = {}
         self.mu_baseline = None
         self.sigma_baseline = None
-        self.baseline_history = {metric: {'mu': [], 'sigma': []} for metric in METRICS}
         self.adaptive_window = 100  # Numero di campioni per adattamento baseline
+        self.baseline_history = {metric: self.new_baseline_history() for metric in METRICS}
+        self.checkpoint = None  # ultimo baseline_state(), preso dal thread di analisi
         self.alpha_baseline = 0.05  # Fattore di smoothing per baseline adattativa
         self.outlier_threshold = 3.0  # Soglia per identificare outlier (in deviazioni standard)
         self.therapy = None
+        self.stream_horizon = 300  # secondi di dati filtrati mantenuti in modalita' incrementale
+        self.stream_quantile_window = 300  # campioni usati per g_max e sigma_max in modalita' incrementale
+        self.reset_stream()
+        self.aggregate_window = 60  # secondi della media usata da generate_status
+        self.aggregator = RollingAggregator(int(self.aggregate_window * 1e9), METRICS)
+
+    def new_baseline_history(self):
+        """Storico della baseline di una metrica: ring buffer di mu e P10 streaming di sigma"""
+        return {
+            'mu': RingBuffer(self.adaptive_window),
+            'sigma': RollingQuantile(self.adaptive_window, 10)
+        }
 
     def update_adaptive_baseline(self, metric, new_value, is_outlier=False):
         """
@@ -47,14 +110,10 @@ class Analyzer:
         if metric not in self.mu_baseline or metric not in self.sigma_baseline:
             return
         
-        # Aggiorna il buffer storico
-        self.baseline_history[metric]['mu'].append(self.mu_baseline[metric])
-        self.baseline_history[metric]['sigma'].append(self.sigma_baseline[metric])
-        
-        # Mantieni solo gli ultimi N valori
-        if len(self.baseline_history[metric]['mu']) > self.adaptive_window:
-            self.baseline_history[metric]['mu'].pop(0)
-            self.baseline_history[metric]['sigma'].pop(0)
+        # Aggiorna il buffer storico (ring buffer: mantiene solo gli ultimi N valori)
+        history = self.baseline_history[metric]
+        history['mu'].push(self.mu_baseline[metric])
+        history['sigma'].push(self.sigma_baseline[metric])
         
         # Fattore di adattamento: più basso per outlier, più alto per valori normali
         if is_outlier:
@@ -67,7 +126,7 @@ class Analyzer:
         self.mu_baseline[metric] = alpha * new_value + (1 - alpha) * old_mu
         
         # Calcola varianza incrementale (Welford's online algorithm)
-        if len(self.baseline_history[metric]['mu']) > 1:
+        if len(history['mu']) > 1:
             # Calcola deviazione incrementale
             delta = new_value - old_mu
             old_sigma = self.sigma_baseline[metric]
@@ -77,12 +136,13 @@ class Analyzer:
             current_variance = (new_value - self.mu_baseline[metric]) ** 2
             
             # Calcola media mobile della varianza sugli ultimi N campioni
-            if len(self.baseline_history[metric]['sigma']) > 0:
+            if len(history['sigma']) > 0:
                 # Usa EWMA per la varianza
                 self.sigma_baseline[metric] = alpha * current_variance + (1 - alpha) * old_sigma
                 
                 # Assicurati che la varianza non sia troppo piccola
-                min_variance = np.percentile(self.baseline_history[metric]['sigma'], 10) if len(self.baseline_history[metric]['sigma']) > 10 else 0.1
+                # P10 della storia di sigma, aggiornato in streaming
+                min_variance = history['sigma'].value() if len(history['sigma']) > 10 else 0.1
                 self.sigma_baseline[metric] = max(self.sigma_baseline[metric], min_variance)
         
     
@@ -139,121 +199,74 @@ class Analyzer:
         return alpha_t
     
     #def generate_status(self, average_data, therapy: dict):
-    def generate_status(self, average_data):
-        status = {}
-
-        # =========================
-        # LOAD THRESHOLDS
-        # =========================
-
-        spo2_stable = CLINICAL_RULES.getfloat("oxygen", "stable_spo2")
-        spo2_light = CLINICAL_RULES.getfloat("oxygen", "light_hypoxia_min")
-        #oxygen_fail = CLINICAL_RULES.getfloat("oxygen", "oxygen_failure_threshold")
-        oxygen_fail_time = CLINICAL_RULES.getfloat("oxygen", "oxygen_failure_threshold")
-        rr_min = CLINICAL_RULES.getfloat("respiration", "rr_min")
-        rr_max = CLINICAL_RULES.getfloat("respiration", "rr_max")
-        rr_tachy = CLINICAL_RULES.getfloat("respiration", "tachy_min")
-        rr_distress = CLINICAL_RULES.getfloat("respiration", "distress_min")
-
-        hr_min = CLINICAL_RULES.getfloat("heart_rate", "hr_min")
-        hr_max = CLINICAL_RULES.getfloat("heart_rate", "hr_max")
-        hr_tachy = CLINICAL_RULES.getfloat("heart_rate", "tachy_min")
-        hr_primary = CLINICAL_RULES.getfloat("heart_rate", "primary_min")
-        max_tachy = CLINICAL_RULES.getfloat("heart_rate", "max_tachy")
-
-        map_shock = CLINICAL_RULES.getfloat("pressure", "map_shock")
-        map_hypo = CLINICAL_RULES.getfloat("pressure", "map_hypo")
-        sbp_shock = CLINICAL_RULES.getfloat("pressure", "sbp_shock")
-
-        # =========================
-        # COMPUTE MEAN VALUES
-        # =========================
-
-        mean_spo2 = average_data["spo2"].mean()
-        mean_rr = average_data["rr"].mean()
-        mean_hr = average_data["hr"].mean()
-        mean_map = average_data["map"].mean()
-        mean_sbp = average_data["sbp"].mean()
-
-        # =========================
-        # OXYGENATION
-        # =========================
-
-        if mean_spo2 >= spo2_stable and rr_min <= mean_rr <= rr_max:
-            status["oxigenation"] = "STABLE_RESPIRATION"
-
-        elif spo2_light <= mean_spo2 < spo2_stable:
-            status["oxigenation"] = "LIGHT_HYPOXIA"
-
-        elif mean_spo2 < spo2_light:
-            #if therapy.get("ox_therapy", 0) >= oxygen_fail:
-            if self.hypoxia_starting_time > 0 and \
-                (datetime.now().timestamp() - self.hypoxia_starting_time) > oxygen_fail_time:
-                status["oxigenation"] = "FAILURE_OXYGEN_THERAPY"
-            else:
-                status["oxigenation"] = "GRAVE_HYPOXIA"
-
-        else:
-            status["oxigenation"] = "STABLE_SATURATION"
-
-        # =========================
-        # RESPIRATION
-        # =========================
-
-        if rr_tachy <= mean_rr <= rr_distress:
-            status["respiration"] = "MODERATE_TACHYPNEA"
-
-        elif mean_rr > rr_distress:
-            status["respiration"] = "RESPIRATORY_DISTRESS"
-
-        elif mean_rr < rr_min:
-            status["respiration"] = "BRADYPNEA"
-
-        else:
-            status["respiration"] = "STABLE_RESPIRATION_EFFORT"
+    def generate_status(self, average_data, rules: ClinicalRules | None = None):
+        # Snapshot delle soglie compilate da clinical_rules.ini (ricaricato da RulesWatcher)
+        rules = rules if rules is not None else current_rules()
 
-        # =========================
-        # HEART RATE
-        # =========================
+        return self.classify_inputs(self.rule_inputs(average_data), rules)
 
-        if hr_min <= mean_hr <= hr_max:
-            status["heart_rate"] = "STABLE_HR"
+    def classify_inputs(self, x, rules: ClinicalRules | None = None):
+        """Come generate_status, dal vettore di ingresso delle regole (ordine di RULE_INPUTS)"""
+        rules = rules if rules is not None else current_rules()
 
-        elif (average_data["spo2"] >= spo2_stable).all() and \
-            (average_data["hr"] > hr_primary).all() and \
-            (average_data["map"] >= map_hypo).all():
-            status["heart_rate"] = "PRIMARY_TACHYCARDIA"
+        #oxygen_fail = therapy.get("ox_therapy", 0) >= rules.oxygen_fail_time
+        hypoxia_failed = self.hypoxia_starting_time > 0 and \
+            (self.clock() - self.hypoxia_starting_time) > rules.oxygen_fail_time
 
-        elif (average_data["spo2"] >= spo2_stable).all() and \
-            (average_data["hr"] > hr_tachy).all():
-            status["heart_rate"] = "COMPENSED_TACHYCARDIA"
+        return rules.classify(x, hypoxia_failed)
 
-        else:
-            status["heart_rate"] = "HIGH_HR"
-
-
-        # =========================
-        # BLOOD PRESSURE
-        # =========================
-
-        if mean_map < map_hypo:
-
-            if mean_map < map_shock or mean_sbp < sbp_shock:
-                status["blood_pressure"] = "SHOCK"
-
-            elif mean_rr > rr_distress:
-                status["blood_pressure"] = "DISTRESS_OVERLOAD"
+    @staticmethod
+    def rule_inputs(average_data: pd.DataFrame) -> np.ndarray:
+        """
+        Vettore di ingresso delle regole cliniche (ordine di RULE_INPUTS):
+        medie di spo2, rr, hr, map, sbp e minimi di spo2, hr, map
+        """
+        values = np.column_stack([
+            average_data[m].to_numpy(dtype=float) for m in ("spo2", "rr", "hr", "map", "sbp")
+        ])
+        if len(values) == 0:
+            return np.array([np.nan] * 5 + [np.inf] * 3)
+
+        # medie che ignorano i NaN, come Series.mean()
+        observed = ~np.isnan(values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(observed, values, 0).sum(axis=0) / observed.sum(axis=0)
+
+        # min >= soglia equivale a (colonna >= soglia).all(): un NaN nel minimo
+        # rende falso il confronto, come nell'.all()
+        mins = values[:, [0, 2, 3]].min(axis=0)
+        return np.concatenate((means, mins))
+
+    def update_aggregate(self, data: pd.DataFrame) -> int:
+        """
+        Inserisce nell'aggregatore i campioni di data piu' recenti dell'ultimo
+        gia' inserito per ogni metrica. Restituisce il numero di campioni aggiunti.
+        """
+        pushed = 0
+        for m in METRICS:
+            if m not in data.columns or f"time_{m}" not in data.columns:
+                continue
 
-            elif mean_hr > hr_tachy:
-                status["blood_pressure"] = "CIRCULARITY_UNSTABILITY"
+            times = data[f"time_{m}"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+            values = data[m].to_numpy(dtype=float)
 
-            else:
-                status["blood_pressure"] = "MODERATE_HYPOTENSION"
+            last_t = self.aggregator.last_t[m]
+            new = np.arange(len(times)) if last_t is None else np.flatnonzero(times > last_t)
+            for i in new:
+                pushed += self.aggregator.push(m, int(times[i]), values[i])
+        return pushed
 
-        else:
-            status["blood_pressure"] = "NORMAL_PERFUSION"
+    def aggregate_inputs(self) -> np.ndarray | None:
+        """
+        Ingresso delle regole cliniche dalle medie dell'ultimo minuto
+        (None se non ci sono campioni). Come per la riga unica di
+        compute_agg_from_raw, i minimi coincidono con le medie.
+        """
+        if self.aggregator.end is None:
+            return None
 
-        return status
+        means = [self.aggregator.mean(m) for m in ("spo2", "rr", "hr", "map", "sbp")]
+        return np.array(means + [means[0], means[2], means[3]])
 
     def apply_EWMA(self, alpha_t, x_t, metric):
         """Applica EWMA con alpha_t calcolato"""
@@ -326,23 +339,311 @@ class Analyzer:
             data[c] = ewma_values
             time.sleep(1)
         return data
-    
+
+    def filter_EWMA_batch(self, data: pd.DataFrame, alpha_min=0.02, alpha_max=0.1, w1=1, w2=1, w3=1):
+        """
+        Filtraggio EWMA vettoriale, equivalente a filter_EWMA.
+
+        Gradienti, varianza mobile, normalizzazioni e alpha_t sono calcolati
+        come matrici (campioni x metriche); resta sequenziale solo l'aggiornamento
+        della baseline adattativa, che dipende dal campione precedente.
+        """
+        return self.filter_EWMA_rates(data, {'rate': (alpha_min, alpha_max)}, w1, w2, w3)['rate']
+
+    def filter_EWMA_rates(self, data: pd.DataFrame, rates=EWMA_RATES, w1=1, w2=1, w3=1) -> dict:
+        """
+        Come filter_EWMA_batch, per piu' intervalli di alpha in un solo passaggio.
+
+        Gradienti, varianza mobile, percentili e scostamento dalla baseline sono
+        calcolati una volta sola e condivisi; la baseline adattativa viene
+        aggiornata una volta per campione, non una volta per velocita'.
+
+        Returns:
+            {rate: DataFrame filtrato} per ogni voce di rates
+        """
+        if data.empty:
+            return {rate: data for rate in rates}
+
+        float_cols = list(data.select_dtypes(include=['float']).columns)
+        time_cols = list(data.select_dtypes(include=['datetimetz', 'datetime']).columns)
+        # Stesso accoppiamento posizionale (time_k, val_k) di filter_EWMA
+        float_cols = float_cols[:len(time_cols)]
+        if not float_cols:
+            return {rate: data.copy() for rate in rates}
+
+        x = data[float_cols].to_numpy(dtype=float)
+
+        # Differenze temporali
+        t = np.column_stack([data[c].astype('int64').to_numpy() / 1e9 for c in time_cols[:len(float_cols)]])
+        dt = np.empty_like(t)
+        dt[0] = 1
+        dt[1:] = np.diff(t, axis=0)
+
+        # Gradiente dei valori
+        dx = np.empty_like(x)
+        dx[0] = np.nan
+        dx[1:] = np.diff(x, axis=0)
+        dx[dx == 0] = 1e-9
+        dx[np.isnan(dx)] = 1e-9
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g = dx / dt
+        g_abs = np.abs(g)
+
+        # Gradiente massimo (95° percentile) per evitare spike
+        g_max = np.percentile(g_abs, 95, axis=0)
+
+        # Varianza mobile (span crescente per colonna, come filter_EWMA)
+        sigma = np.column_stack([
+            data[c].ewm(span=i + 1).var().fillna(0).to_numpy()
+            for i, c in enumerate(float_cols)
+        ])
+        sigma_max = np.percentile(sigma, 95) if sigma.size else 1
+
+        # Normalizzazioni
+        if sigma_max > 0:
+            sigma_norm = np.minimum(sigma / sigma_max, 1)
+        else:
+            sigma_norm = np.zeros_like(sigma)
+
+        g_norm = np.zeros_like(g_abs)
+        np.divide(g_abs, g_max, out=g_norm, where=g_max > 0)
+        g_norm = np.minimum(g_norm, 1)
+
+        # Scostamento dalla baseline: ricorrenza sequenziale
+        c_t, is_outlier = self.baseline_scores(float_cols, x)
+
+        filtered = {}
+        for rate, (alpha_min, alpha_max) in rates.items():
+            alpha_t = adaptive_alpha(sigma_norm, g_norm, c_t, is_outlier, alpha_min, alpha_max, w1, w2, w3)
+
+            # Applica EWMA partendo dal primo valore
+            ewma = time_varying_ewma(alpha_t, x, x[0])
+            out = data.copy()
+            for i, c in enumerate(float_cols):
+                self.EWMA[c] = ewma[-1, i]
+                out[c] = ewma[:, i]
+            filtered[rate] = out
+
+        return filtered
+
+    def baseline_scores(self, metrics, x):
+        """
+        Scorre i campioni in ordine e, per ognuno, calcola c_t normalizzato e
+        il flag di outlier rispetto alla baseline corrente, poi aggiorna la
+        baseline (stessa sequenza di calculate_alpha).
+
+        Returns:
+            (c_t, is_outlier): matrici (campioni x metriche)
+        """
+        c_t = np.zeros(x.shape)
+        is_outlier = np.zeros(x.shape, dtype=bool)
+
+        for j, metric in enumerate(metrics):
+            for i, x_t in enumerate(x[:, j].tolist()):
+                outlier = self.detect_outlier(metric, x_t)
+                sigma_baseline = self.sigma_baseline[metric]
+                if sigma_baseline > 0:
+                    c_t[i, j] = min(abs(x_t - self.mu_baseline[metric]) / np.sqrt(sigma_baseline), 5) / 5
+                is_outlier[i, j] = outlier
+                self.update_adaptive_baseline(metric, x_t, outlier)
+
+        return c_t, is_outlier
+
+    # =========================
+    # MODALITA' INCREMENTALE
+    # =========================
+
+    def reset_stream(self):
+        """Azzera lo stato del filtraggio incrementale"""
+        self.stream_metrics = None
+        self.stream_watermark = None  # timestamp (ns) dell'ultimo campione elaborato
+        self.stream_prev_t = None
+        self.stream_prev_x = None
+        self.stream_var = None
+        self.stream_g_max = None
+        self.stream_sigma_max = None
+        self.stream_EWMA = {}
+        self.stream_window = deque()  # (t, {rate: valori filtrati})
+
+    def update_stream(self, data: pd.DataFrame, rates=EWMA_RATES) -> int:
+        """
+        Elabora solo i campioni piu' recenti del watermark, mantenendo tra un
+        ciclo e l'altro EWMA lenta/veloce, varianza mobile e gradienti.
+
+        A differenza di filter_EWMA, g_max e sigma_max sono i percentili sugli
+        ultimi stream_quantile_window campioni gia' visti, non sull'intera
+        finestra letta.
+
+        Returns:
+            numero di campioni nuovi elaborati
+        """
+        if data.empty:
+            return 0
+
+        float_cols = list(data.select_dtypes(include=['float']).columns)
+        time_cols = list(data.select_dtypes(include=['datetimetz', 'datetime']).columns)
+        metrics = [m for m in METRICS if m in float_cols]
+        if not metrics or not time_cols:
+            return 0
+
+        times = data[time_cols[0]].dt.as_unit('ns').astype('int64').to_numpy()
+        new = times > self.stream_watermark if self.stream_watermark is not None else np.ones(len(times), dtype=bool)
+        if not new.any():
+            return 0
+
+        if metrics != self.stream_metrics:
+            self.reset_stream()
+            self.stream_metrics = metrics
+            self.stream_var = EWMVariance(range(1, len(metrics) + 1))
+            self.stream_g_max = [RollingQuantile(self.stream_quantile_window, 95) for _ in metrics]
+            self.stream_sigma_max = RollingQuantile(self.stream_quantile_window * len(metrics), 95)
+
+        x = data.loc[new, metrics].to_numpy(dtype=float)
+        t = times[new]
+        for x_t, t_ns in zip(x, t.tolist()):
+            self.stream_step(x_t, t_ns / 1e9, rates)
+
+        self.stream_watermark = int(t[-1])
+        return len(x)
+
+    def stream_step(self, x_t, t, rates=EWMA_RATES):
+        """Elabora un singolo campione (vettore delle metriche) al tempo t in secondi"""
+        metrics = self.stream_metrics
+
+        # Gradiente rispetto al campione precedente
+        if self.stream_prev_x is None:
+            g = np.full(len(metrics), 1e-9)
+        else:
+            dx = x_t - self.stream_prev_x
+            dx[dx == 0] = 1e-9
+            dx[np.isnan(dx)] = 1e-9
+            with np.errstate(divide='ignore', invalid='ignore'):
+                g = dx / (t - self.stream_prev_t)
+        g_abs = np.abs(g)
+
+        # Varianza mobile
+        sigma = np.nan_to_num(self.stream_var.push(x_t), nan=0.0)
+
+        for quantile, value in zip(self.stream_g_max, g_abs.tolist()):
+            quantile.push(value)
+        self.stream_sigma_max.extend(sigma.tolist())
+        g_max = np.array([quantile.value() for quantile in self.stream_g_max])
+        sigma_max = self.stream_sigma_max.value()
+
+        # Normalizzazioni
+        sigma_norm = np.minimum(sigma / sigma_max, 1) if sigma_max > 0 else np.zeros_like(sigma)
+        g_norm = np.zeros_like(g_abs)
+        np.divide(g_abs, g_max, out=g_norm, where=g_max > 0)
+        g_norm = np.minimum(g_norm, 1)
+
+        # EWMA per ogni velocita' (baseline aggiornata una volta, come in filter_EWMA_rates)
+        c_t, is_outlier = self.baseline_scores(metrics, x_t[None, :])
+        filtered = {}
+        for rate, (alpha_min, alpha_max) in rates.items():
+            alpha_t = adaptive_alpha(sigma_norm, g_norm, c_t[0], is_outlier[0], alpha_min, alpha_max)
+            previous = self.stream_EWMA.get(rate, x_t)
+            self.stream_EWMA[rate] = alpha_t * x_t + (1 - alpha_t) * previous
+            filtered[rate] = self.stream_EWMA[rate]
+
+        # Finestra dei valori filtrati per trend e slope
+        self.stream_window.append((t, filtered))
+        while self.stream_window[0][0] < t - self.stream_horizon:
+            self.stream_window.popleft()
+
+        self.stream_prev_x = x_t
+        self.stream_prev_t = t
+
+    def stream_trend(self, rate="slow") -> pd.DataFrame:
+        """Come calculate_trend, sulla finestra filtrata incrementale"""
+        trend_mean = pd.DataFrame()
+        if not self.stream_window:
+            return trend_mean
+
+        delta = self.stream_window[-1][1][rate] - self.stream_window[0][1][rate]
+        for i, c in enumerate(self.stream_metrics):
+            if self.sigma_baseline[c] == 0:
+                trend_mean[c] = [0.0]
+                continue
+            trend_mean[c] = [delta[i] / np.sqrt(self.sigma_baseline[c])]
+        return trend_mean
+
+    def stream_slope(self, slow="slow", fast="fast") -> dict:
+        """Come calculate_slope, sulla finestra filtrata incrementale"""
+        slope = {c: 0 for c in METRICS}
+        if len(self.stream_window) < 2:
+            return slope
+
+        # Tempi crescenti: il Δt medio e' l'ampiezza della finestra / (n - 1)
+        dt = (self.stream_window[-1][0] - self.stream_window[0][0]) / (len(self.stream_window) - 1)
+        if dt == 0:
+            return slope
+
+        last = self.stream_window[-1][1]
+        delta = last[fast] - last[slow]
+        for i, c in enumerate(self.stream_metrics):
+            slope[c] = delta[i] / dt
+        return slope
+
     def initialize_baseline(self, data):
         """Inizializza la baseline con i dati storici"""
         float_cols = data.select_dtypes(include=['float'])
         print(float_cols)
-        self.mu_baseline = {str(i): float_cols[i].mean() for i in float_cols.columns}
-        self.sigma_baseline = {str(i): float_cols[i].var() for i in float_cols.columns}
+        self.initialize_baseline_stats(
+            {str(i): float_cols[i].mean() for i in float_cols.columns},
+            {str(i): float_cols[i].var() for i in float_cols.columns}
+        )
+
+    def initialize_baseline_stats(self, mu: dict, sigma: dict):
+        """Inizializza la baseline da media e varianza per metrica (es. calcolate da Influx)"""
+        self.mu_baseline = dict(mu)
+        self.sigma_baseline = dict(sigma)
         
         """print("Baseline initialized:")
-        for metric in float_cols.columns:
+        for metric in self.mu_baseline:
             print(f"  {metric}: μ = {self.mu_baseline[metric]:.2f}, σ = {np.sqrt(self.sigma_baseline[metric]):.2f}")
         """        
         # Inizializza buffer storico
-        for metric in float_cols.columns:
-            self.baseline_history[metric]['mu'] = [self.mu_baseline[metric]]
-            self.baseline_history[metric]['sigma'] = [self.sigma_baseline[metric]]
-    
+        for metric in self.mu_baseline:
+            self.baseline_history[metric] = self.new_baseline_history()
+            self.baseline_history[metric]['mu'].push(self.mu_baseline[metric])
+            self.baseline_history[metric]['sigma'].push(self.sigma_baseline[metric])
+        self.take_checkpoint()
+
+    def baseline_state(self) -> dict:
+        """Baseline, ultimo valore EWMA e storico della baseline, per metrica (ordine di METRICS, NaN se assente)"""
+        def vector(values):
+            values = values or {}
+            return np.array([values.get(m, np.nan) for m in METRICS], dtype=float)
+
+        return {
+            'mu': vector(self.mu_baseline),
+            'sigma': vector(self.sigma_baseline),
+            'ewma': vector(self.EWMA),
+            'mu_history': [self.baseline_history[m]['mu'].values() for m in METRICS],
+            'sigma_history': [self.baseline_history[m]['sigma'].values() for m in METRICS]
+        }
+
+    def take_checkpoint(self):
+        """
+        Copia dello stato per il CheckpointWriter. Va chiamata dal thread che
+        aggiorna la baseline, cosi' il writer non legge uno stato a meta'.
+        """
+        self.checkpoint = self.baseline_state()
+
+    def restore_baseline(self, mu, sigma, ewma, mu_history, sigma_history):
+        """Ripristina lo stato salvato da baseline_state, senza rileggere lo storico"""
+        self.mu_baseline = {m: float(v) for m, v in zip(METRICS, mu) if not np.isnan(v)}
+        self.sigma_baseline = {m: float(v) for m, v in zip(METRICS, sigma) if not np.isnan(v)}
+        self.EWMA = {m: float(v) for m, v in zip(METRICS, ewma) if not np.isnan(v)}
+
+        for m, mu_values, sigma_values in zip(METRICS, mu_history, sigma_history):
+            self.baseline_history[m] = self.new_baseline_history()
+            self.baseline_history[m]['mu'].extend(mu_values[-self.adaptive_window:])
+            self.baseline_history[m]['sigma'].extend(sigma_values[-self.adaptive_window:])
+
+        self.par_initialized = True
+        self.take_checkpoint()
+
     """
     def calculate_trend(self,slow_EWMA_data, fast_EWMA_data):
             trend = fast_EWMA_data - slow_EWMA_data
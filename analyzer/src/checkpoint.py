@@ -0,0 +1,173 @@
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from analyzer import METRICS
+
+
+def checkpoint_dtype(window: int) -> np.dtype:
+    """Un record per paziente: baseline, ultimo valore EWMA e storico della baseline"""
+    metrics = len(METRICS)
+    return np.dtype([
+        ("patient_id", "U32"),
+        ("saved_at", "f8"),  # epoch in secondi, 0 = slot mai scritto
+        ("mu", "f8", (metrics,)),
+        ("sigma", "f8", (metrics,)),
+        ("ewma", "f8", (metrics,)),
+        ("history_count", "i4", (metrics,)),
+        ("mu_history", "f8", (metrics, window)),
+        ("sigma_history", "f8", (metrics, window)),
+    ])
+
+
+class BaselineStore:
+    """
+    Checkpoint delle baseline di tutti i pazienti in un unico file .npy
+    memory-mapped, uno slot fisso per paziente.
+
+    Il file viene aperto (o creato) dal processo principale con l'elenco
+    completo dei pazienti: gli slot gia' presenti restano dove sono, i pazienti
+    nuovi occupano slot liberi. I processi worker riaprono lo stesso file e
+    scrivono solo gli slot dei propri pazienti.
+    Un file con un formato diverso (es. adaptive_window cambiata) viene ricreato.
+    I checkpoint piu' vecchi di max_age secondi non vengono ripristinati.
+    """
+
+    def __init__(self, path: Path, patient_ids: list[str], window: int = 100, max_age: float | None = None):
+        self.path = Path(path)
+        self.dtype = checkpoint_dtype(window)
+        self.max_age = max_age
+        self.records = self.open(patient_ids)
+        self.slots = {
+            str(patient_id): slot
+            for slot, patient_id in enumerate(self.records["patient_id"])
+            if patient_id
+        }
+
+    def open(self, patient_ids: list[str]) -> np.memmap:
+        existing = None
+        if self.path.exists():
+            try:
+                existing = np.load(self.path, mmap_mode="r+")
+            except (OSError, ValueError) as e:
+                print(f"[CHECKPOINT] Unreadable {self.path}, recreating: {e}")
+            else:
+                if existing.dtype != self.dtype:
+                    print(f"[CHECKPOINT] Format of {self.path} changed, recreating")
+                    existing = None
+
+        known = set() if existing is None else set(existing["patient_id"]) - {""}
+        missing = [patient_id for patient_id in patient_ids if patient_id not in known]
+        free = 0 if existing is None else int((existing["patient_id"] == "").sum())
+
+        if existing is not None and len(missing) <= free:
+            records = existing
+        else:
+            # file nuovo, o piu' grande: i record esistenti vengono copiati
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            capacity = len(known) + len(missing)
+            tmp = self.path.with_suffix(".tmp.npy")
+            records = np.lib.format.open_memmap(tmp, mode="w+", dtype=self.dtype, shape=(capacity,))
+            if existing is not None:
+                kept = existing[existing["patient_id"] != ""]
+                records[:len(kept)] = kept
+                del existing
+            records.flush()
+            del records
+            tmp.replace(self.path)
+            records = np.load(self.path, mmap_mode="r+")
+
+        empty = np.flatnonzero(records["patient_id"] == "")
+        for slot, patient_id in zip(empty, missing):
+            records["patient_id"][slot] = patient_id
+        records.flush()
+        return records
+
+    def save(self, analyzers: dict) -> int:
+        """
+        Scrive l'ultima copia dello stato (Analyzer.take_checkpoint) degli
+        Analyzer inizializzati; restituisce il numero di pazienti salvati
+        """
+        saved = 0
+        now = time.time()
+        for patient_id, analyzer in analyzers.items():
+            slot = self.slots.get(str(patient_id))
+            state = analyzer.checkpoint
+            if slot is None or state is None:
+                continue
+
+            record = np.zeros((), dtype=self.dtype)
+            record["patient_id"] = patient_id
+            record["saved_at"] = now
+            record["mu"] = state["mu"]
+            record["sigma"] = state["sigma"]
+            record["ewma"] = state["ewma"]
+            for j, (mu, sigma) in enumerate(zip(state["mu_history"], state["sigma_history"])):
+                record["history_count"][j] = len(mu)
+                record["mu_history"][j, :len(mu)] = mu
+                record["sigma_history"][j, :len(sigma)] = sigma
+
+            self.records[slot] = record
+            saved += 1
+
+        self.records.flush()
+        return saved
+
+    def restore(self, patient_id: str, analyzer) -> bool:
+        """Ripristina la baseline del paziente; False se non c'e' un checkpoint o e' troppo vecchio"""
+        slot = self.slots.get(str(patient_id))
+        if slot is None:
+            return False
+
+        record = self.records[slot]
+        if record["saved_at"] <= 0:
+            return False
+
+        age = time.time() - record["saved_at"]
+        if self.max_age is not None and age > self.max_age:
+            print(f"[CHECKPOINT] Checkpoint of patient {patient_id} is {age:.0f}s old, rebuilding the baseline")
+            return False
+
+        counts = record["history_count"]
+        analyzer.restore_baseline(
+            mu=record["mu"],
+            sigma=record["sigma"],
+            ewma=record["ewma"],
+            mu_history=[record["mu_history"][j, :n] for j, n in enumerate(counts)],
+            sigma_history=[record["sigma_history"][j, :n] for j, n in enumerate(counts)]
+        )
+        return True
+
+
+class CheckpointWriter:
+    """Salva periodicamente le baseline di un gruppo di Analyzer in un BaselineStore"""
+
+    def __init__(self, store: BaselineStore, analyzers: dict, interval: float = 60):
+        self.store = store
+        self.analyzers = analyzers
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="checkpoint_writer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Ferma il thread e scrive un ultimo checkpoint"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval)
+        self.save()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.save()
+
+    def save(self):
+        try:
+            self.store.save(self.analyzers)
+        except Exception as e:
+            print(f"[CHECKPOINT] Error writing {self.store.path}: {e}")
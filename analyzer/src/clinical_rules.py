@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+import configparser
+
+import numpy as np
+
+# Ingressi della classificazione, nell'ordine del vettore di classify.
+# Le medie servono a tutte le regole; i minimi riproducono i controlli
+# (average_data[...] >= soglia).all() della tachicardia.
+RULE_INPUTS = ("spo2", "rr", "hr", "map", "sbp", "min_spo2", "min_hr", "min_map")
+
+
+@dataclass(frozen=True, slots=True)
+class ClinicalRules:
+    """
+    Snapshot immutabile delle soglie di clinical_rules.ini, convertite in float.
+
+    classify() valuta le regole di Analyzer.generate_status su un vettore di
+    float. Come nelle regole originali, un NaN rende falso ogni confronto.
+    """
+
+    spo2_stable: float
+    spo2_light: float
+    oxygen_fail_time: float
+
+    rr_min: float
+    rr_max: float
+    rr_tachy: float
+    rr_distress: float
+
+    hr_min: float
+    hr_max: float
+    hr_tachy: float
+    hr_primary: float
+    max_tachy: float
+
+    map_shock: float
+    map_hypo: float
+    sbp_shock: float
+
+    # identifica lo snapshot delle soglie (pubblicato con i sintomi)
+    version: str = ""
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser, version: str = "") -> "ClinicalRules":
+        return cls(
+            spo2_stable=config.getfloat("oxygen", "stable_spo2"),
+            spo2_light=config.getfloat("oxygen", "light_hypoxia_min"),
+            oxygen_fail_time=config.getfloat("oxygen", "oxygen_failure_threshold"),
+
+            rr_min=config.getfloat("respiration", "rr_min"),
+            rr_max=config.getfloat("respiration", "rr_max"),
+            rr_tachy=config.getfloat("respiration", "tachy_min"),
+            rr_distress=config.getfloat("respiration", "distress_min"),
+
+            hr_min=config.getfloat("heart_rate", "hr_min"),
+            hr_max=config.getfloat("heart_rate", "hr_max"),
+            hr_tachy=config.getfloat("heart_rate", "tachy_min"),
+            hr_primary=config.getfloat("heart_rate", "primary_min"),
+            max_tachy=config.getfloat("heart_rate", "max_tachy"),
+
+            map_shock=config.getfloat("pressure", "map_shock"),
+            map_hypo=config.getfloat("pressure", "map_hypo"),
+            sbp_shock=config.getfloat("pressure", "sbp_shock"),
+
+            version=version,
+        )
+
+    def validate(self):
+        """Controlla che le soglie siano finite e ordinate in modo coerente"""
+        for name in self.__dataclass_fields__:
+            value = getattr(self, name)
+            if name != "version" and not np.isfinite(value):
+                raise ValueError(f"{name} is not a finite number: {value}")
+
+        ordered = [
+            ("spo2_light", "spo2_stable"),
+            ("rr_min", "rr_max"),
+            ("rr_tachy", "rr_distress"),
+            ("hr_min", "hr_max"),
+            ("hr_tachy", "hr_primary"),
+            ("map_shock", "map_hypo"),
+        ]
+        for low, high in ordered:
+            if getattr(self, low) > getattr(self, high):
+                raise ValueError(f"{low} ({getattr(self, low)}) is greater than {high} ({getattr(self, high)})")
+
+        if self.oxygen_fail_time < 0:
+            raise ValueError(f"oxygen_fail_time is negative: {self.oxygen_fail_time}")
+
+    def classify(self, x, hypoxia_failed: bool = False) -> dict:
+        """
+        Stato clinico di un paziente.
+        x: valori nell'ordine di RULE_INPUTS; hypoxia_failed: ipossia grave
+        che dura da piu' di oxygen_fail_time.
+        """
+        spo2, rr, hr, map_, sbp, min_spo2, min_hr, min_map = (float(v) for v in x)
+        status = {}
+
+        # OXYGENATION
+        if spo2 >= self.spo2_stable and self.rr_min <= rr <= self.rr_max:
+            status["oxigenation"] = "STABLE_RESPIRATION"
+        elif self.spo2_light <= spo2 < self.spo2_stable:
+            status["oxigenation"] = "LIGHT_HYPOXIA"
+        elif spo2 < self.spo2_light:
+            status["oxigenation"] = "FAILURE_OXYGEN_THERAPY" if hypoxia_failed else "GRAVE_HYPOXIA"
+        else:
+            status["oxigenation"] = "STABLE_SATURATION"
+
+        # RESPIRATION
+        if self.rr_tachy <= rr <= self.rr_distress:
+            status["respiration"] = "MODERATE_TACHYPNEA"
+        elif rr > self.rr_distress:
+            status["respiration"] = "RESPIRATORY_DISTRESS"
+        elif rr < self.rr_min:
+            status["respiration"] = "BRADYPNEA"
+        else:
+            status["respiration"] = "STABLE_RESPIRATION_EFFORT"
+
+        # HEART RATE
+        if self.hr_min <= hr <= self.hr_max:
+            status["heart_rate"] = "STABLE_HR"
+        elif min_spo2 >= self.spo2_stable and min_hr > self.hr_primary and min_map >= self.map_hypo:
+            status["heart_rate"] = "PRIMARY_TACHYCARDIA"
+        elif min_spo2 >= self.spo2_stable and min_hr > self.hr_tachy:
+            status["heart_rate"] = "COMPENSED_TACHYCARDIA"
+        else:
+            status["heart_rate"] = "HIGH_HR"
+
+        # BLOOD PRESSURE
+        if map_ < self.map_hypo:
+            if map_ < self.map_shock or sbp < self.sbp_shock:
+                status["blood_pressure"] = "SHOCK"
+            elif rr > self.rr_distress:
+                status["blood_pressure"] = "DISTRESS_OVERLOAD"
+            elif hr > self.hr_tachy:
+                status["blood_pressure"] = "CIRCULARITY_UNSTABILITY"
+            else:
+                status["blood_pressure"] = "MODERATE_HYPOTENSION"
+        else:
+            status["blood_pressure"] = "NORMAL_PERFUSION"
+
+        return status
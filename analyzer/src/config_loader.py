@@ -1,11 +1,97 @@
 import configparser
+import hashlib
+import threading
 from pathlib import Path
 
+from clinical_rules import ClinicalRules
+
 BASE_DIR = Path(__file__).resolve().parent
 
 CONFIG_PATH = BASE_DIR.parent / "config" / "clinical_rules.ini"
 
-config = configparser.ConfigParser()
-config.read(CONFIG_PATH)
 
-CLINICAL_RULES = config
+def load_rules(path: Path = CONFIG_PATH) -> ClinicalRules:
+    """
+    Legge, compila e valida clinical_rules.ini.
+    La versione e' l'hash del contenuto del file: uguale tra riavvii e repliche.
+    Solleva un'eccezione se il file manca, e' malformato o non e' valido.
+    """
+    text = Path(path).read_bytes()
+
+    parser = configparser.ConfigParser()
+    parser.read_string(text.decode())
+
+    rules = ClinicalRules.from_config(parser, version=hashlib.sha256(text).hexdigest()[:12])
+    rules.validate()
+    return rules
+
+
+# Soglie compilate, per Analyzer.generate_status. Il riferimento viene
+# sostituito in blocco da RulesWatcher: chi legge current_rules() ottiene
+# sempre uno snapshot completo e immutabile.
+RULES = load_rules()
+
+
+def current_rules() -> ClinicalRules:
+    return RULES
+
+
+def swap_rules(rules: ClinicalRules):
+    global RULES
+    RULES = rules
+
+
+class RulesWatcher:
+    """
+    Ricarica clinical_rules.ini quando cambia, senza fermare l'analisi.
+
+    Controlla mtime e dimensione del file ogni interval secondi; un file
+    modificato viene compilato e validato prima di sostituire le regole
+    correnti, altrimenti restano in uso quelle precedenti.
+    """
+
+    def __init__(self, path: Path = CONFIG_PATH, interval: float = 5):
+        self.path = Path(path)
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_stat = self.stat()
+
+    def stat(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="rules_watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.check()
+
+    def check(self) -> bool:
+        """Ricarica le regole se il file e' cambiato; True se sono state sostituite"""
+        stat = self.stat()
+        if stat is None or stat == self.last_stat:
+            return False
+        self.last_stat = stat
+
+        try:
+            rules = load_rules(self.path)
+        except Exception as e:
+            print(f"[RULES] Invalid {self.path.name}, keeping version {RULES.version}: {e}")
+            return False
+
+        if rules.version == RULES.version:
+            return False
+
+        previous = RULES.version
+        swap_rules(rules)
+        print(f"[RULES] Reloaded {self.path.name}: version {previous} -> {rules.version}")
+        return True
@@ -1,8 +1,20 @@
-from influxdb_client import InfluxDBClient
+from influxdb_client import InfluxDBClient, Dialect
+import numpy as np
 import pandas as pd
 from influxdb_client.client.write_api import SYNCHRONOUS
+import asyncio
+import io
+import threading
 import os
 
+from metrics import metrics
+
+try:
+    # richiede influxdb-client[async] (aiohttp)
+    from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+except ImportError:
+    InfluxDBClientAsync = None
+
 INFLUX_URL = os.getenv("INFLUX_URL", "http://influxdb:8086")
 INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
 INFLUX_ORG = os.getenv("INFLUX_ORG", "acrss")
@@ -10,6 +22,11 @@ INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "acrss")
 
 METRICS = ["hr", "rr", "spo2", "sbp", "dbp", "map"]
 
+# griglia comune su cui vengono riallineati i sensori (secondi) e
+# massima eta' dell'ultimo campione di un sensore per un punto della griglia
+ALIGN_STEP_SECONDS = float(os.getenv("ANALYZER_ALIGN_STEP_SECONDS", 1))
+ALIGN_STALENESS_SECONDS = float(os.getenv("ANALYZER_ALIGN_STALENESS_SECONDS", 5))
+
 try:
     influx_client = InfluxDBClient(
         url=INFLUX_URL,
@@ -21,6 +38,12 @@ except Exception as e:
     print(f"Connection error {e}")
     influx_client = None
 
+# client asincrono, creato dentro l'event loop da open_async_connection
+async_client = None
+
+# write API sincrona, creata alla prima scrittura
+write_api = None
+
 
 def read_data(
     patient_id: str,
@@ -35,104 +58,542 @@ def read_data(
     - normalizza i dati
     - ADATTA il formato a quello richiesto dall'Analyzer
     """
+    frames = read_data_bulk(
+        [patient_id],
+        measurement=measurement,
+        minutes=minutes,
+        limit=limit,
+        full_history=full_history
+    )
+    return frames.get(patient_id, pd.DataFrame())
+
+
+def read_data_bulk(
+    patient_ids: list[str] | None = None,
+    measurement: str = "vitals_state",
+    minutes: int = 5,
+    limit: int = 5000,
+    full_history: bool = False
+) -> dict[str, pd.DataFrame]:
+    """
+    Come read_data, ma per piu' pazienti con una sola query:
+    restituisce {patient_id: DataFrame per l'Analyzer}.
+    patient_ids=None legge tutti i pazienti presenti.
+    """
+
+    try:
+        wide = query_wide_by_patient(
+            build_query(patient_ids, history_range(minutes, full_history), measurement, limit)
+        )
+        return analyzer_frames(wide)
+
+    except Exception as e:
+        print(f"[Influx read_data error] {e}")
+        import traceback
+        traceback.print_exc()
+        return {}
+
+
+async def read_data_bulk_async(
+    patient_ids: list[str] | None = None,
+    measurement: str = "vitals_state",
+    minutes: int = 5,
+    limit: int = 5000,
+    full_history: bool = False
+) -> dict[str, pd.DataFrame]:
+    """Come read_data_bulk, senza bloccare l'event loop"""
+    try:
+        wide = await query_wide_by_patient_async(
+            build_query(patient_ids, history_range(minutes, full_history), measurement, limit)
+        )
+        return await asyncio.get_running_loop().run_in_executor(None, analyzer_frames, wide)
+
+    except Exception as e:
+        print(f"[Influx read_data error] {e}")
+        import traceback
+        traceback.print_exc()
+        return {}
+
+
+def read_baseline_stats(
+    patient_ids: list[str] | None = None,
+    measurement: str = "vitals_state",
+    hours: float = 24
+) -> dict[str, pd.DataFrame]:
+    """
+    Statistiche per la baseline calcolate da Influx, senza scaricare lo storico:
+    restituisce {patient_id: DataFrame} con indice la metrica (anche map)
+    e colonne count, mean e var (varianza campionaria, come pd.Series.var).
+    """
+    try:
+        return query_baseline_stats(build_stats_query(patient_ids, hours, measurement))
+
+    except Exception as e:
+        print(f"[Influx read_baseline_stats error] {e}")
+        import traceback
+        traceback.print_exc()
+        return {}
 
+
+async def read_baseline_stats_async(
+    patient_ids: list[str] | None = None,
+    measurement: str = "vitals_state",
+    hours: float = 24
+) -> dict[str, pd.DataFrame]:
+    """Come read_baseline_stats, senza bloccare l'event loop"""
+    try:
+        query = build_stats_query(patient_ids, hours, measurement)
+        loop = asyncio.get_running_loop()
+        if async_client is None:
+            return await loop.run_in_executor(None, query_baseline_stats, query)
+
+        response = await async_client.query_api().query_raw(query, dialect=CSV_DIALECT)
+        return await loop.run_in_executor(None, baseline_stats_from_csv, io.StringIO(response))
+
+    except Exception as e:
+        print(f"[Influx read_baseline_stats error] {e}")
+        import traceback
+        traceback.print_exc()
+        return {}
+
+
+def history_range(minutes: int, full_history: bool) -> str:
     if full_history:
-        range_clause = '|> range(start: 0)'
+        return '|> range(start: 0)'
+    return f'|> range(start: -{minutes}m)'
+
+
+def analyzer_frames(wide: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+    return {
+        patient_id: to_analyzer_frame(patient_wide)
+        for patient_id, patient_wide in wide.items()
+    }
+
+
+def build_query(
+    patient_ids: str | list[str] | None,
+    range_clause: str,
+    measurement: str = "vitals_state",
+    limit: int = 5000
+) -> str:
+
+    if patient_ids is None:
+        patient_filter = ''
+    elif isinstance(patient_ids, str):
+        patient_filter = f'|> filter(fn: (r) => r.patient_id == "{patient_ids}")'
     else:
-        range_clause = f'|> range(start: -{minutes}m)'
+        patient_set = ", ".join(f'"{patient_id}"' for patient_id in patient_ids)
+        patient_filter = f'|> filter(fn: (r) => contains(value: r.patient_id, set: [{patient_set}]))'
 
-    query = f'''
+    # limit si applica a ogni serie (paziente, sensore, campo), come nella query per singolo paziente.
+    # Il pivot e' fatto da Influx: una riga per (paziente, _time), una colonna per sensore_campo
+    return f'''
     from(bucket: "{INFLUX_BUCKET}")
       {range_clause}
       |> filter(fn: (r) => r._measurement == "{measurement}")
-      |> filter(fn: (r) => r.patient_id == "{patient_id}")
+      {patient_filter}
       |> sort(columns: ["_time"], desc: false)
       |> limit(n: {limit})
+      |> group(columns: ["patient_id"])
+      |> pivot(rowKey: ["_time"], columnKey: ["sensor", "_field"], valueColumn: "_value")
+      |> group()
     '''
 
+
+def build_stats_query(
+    patient_ids: list[str] | None,
+    hours: float,
+    measurement: str = "vitals_state"
+) -> str:
+    """
+    Rollup orari per (paziente, sensore, campo): conteggio, somma e somma dei
+    quadrati. La map e' calcolata da Influx campione per campione, come in
+    to_analyzer_frame. I rollup vengono uniti da baseline_stats_from_csv.
+    """
+    if patient_ids is None:
+        patient_filter = ''
+    else:
+        patient_set = ", ".join(f'"{patient_id}"' for patient_id in patient_ids)
+        patient_filter = f'|> filter(fn: (r) => contains(value: r.patient_id, set: [{patient_set}]))'
+
+    return f'''
+    data = from(bucket: "{INFLUX_BUCKET}")
+      |> range(start: -{int(hours * 3600)}s)
+      |> filter(fn: (r) => r._measurement == "{measurement}")
+      {patient_filter}
+
+    pressure_map = data
+      |> filter(fn: (r) => r._field == "value_sbp" or r._field == "value_dbp")
+      |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+      |> filter(fn: (r) => exists r.value_sbp and exists r.value_dbp)
+      |> map(fn: (r) => ({{r with _value: (r.value_sbp + 2.0 * r.value_dbp) / 3.0, _field: "value_map"}}))
+
+    union(tables: [data, pressure_map])
+      |> group(columns: ["patient_id", "sensor", "_field"])
+      |> window(every: 1h)
+      |> reduce(
+          identity: {{count: 0.0, sum: 0.0, sumsq: 0.0}},
+          fn: (r, accumulator) => ({{
+            count: accumulator.count + 1.0,
+            sum: accumulator.sum + float(v: r._value),
+            sumsq: accumulator.sumsq + float(v: r._value) * float(v: r._value)
+          }})
+      )
+      |> group()
+      |> keep(columns: ["patient_id", "sensor", "_field", "count", "sum", "sumsq"])
+    '''
+
+
+# CSV senza annotazioni: una riga di intestazione, poi i dati
+CSV_DIALECT = Dialect(header=True, delimiter=",", annotations=[], date_time_format="RFC3339Nano")
+
+
+def query_wide_by_patient(query: str) -> dict[str, pd.DataFrame]:
+    """
+    Esegue la query e divide in memoria i campioni per paziente, in formato wide:
+    indice "time", una colonna per sensore piu' sbp e dbp
+    """
+    response = query_api.query_raw(query, dialect=CSV_DIALECT)
+    try:
+        with metrics.stage("pivot"):
+            return wide_from_csv(response)
+    finally:
+        response.close()
+
+
+async def query_wide_by_patient_async(query: str) -> dict[str, pd.DataFrame]:
+    """
+    Come query_wide_by_patient, senza bloccare l'event loop: con il client
+    asincrono la richiesta HTTP e' non bloccante e solo la decodifica del CSV
+    gira nell'executor; senza, l'intera query gira nell'executor.
+    """
+    loop = asyncio.get_running_loop()
+    if async_client is None:
+        return await loop.run_in_executor(None, query_wide_by_patient, query)
+
+    response = await async_client.query_api().query_raw(query, dialect=CSV_DIALECT)
+    return await loop.run_in_executor(None, timed_wide_from_csv, io.StringIO(response))
+
+
+def timed_wide_from_csv(source) -> dict[str, pd.DataFrame]:
+    with metrics.stage("pivot"):
+        return wide_from_csv(source)
+
+
+def wide_from_csv(source) -> dict[str, pd.DataFrame]:
+    """
+    Decodifica il CSV del pivot (file o buffer) direttamente in pandas,
+    senza passare dai singoli record
+    """
     try:
-        tables = query_api.query(query)
-        if not tables:
-            return pd.DataFrame()
-
-        records = []
-        for table in tables:
-            for r in table.records:
-                records.append({
-                    "time": r.get_time(),
-                    "sensor": r.values.get("sensor"),
-                    "field": r.get_field(),
-                    "value": r.get_value()
-                })
-
-        if not records:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(records)
-
-        base = df[df["field"] == "value"].pivot_table(
-            index="time",
-            columns="sensor",
-            values="value",
-            aggfunc="last"
+        df = pd.read_csv(
+            source,
+            usecols=lambda c: c == "_time" or c == "patient_id" or "_value" in c,
+            dtype={"patient_id": str}
         )
+    except pd.errors.EmptyDataError:
+        return {}
 
-        sbp = df[df["field"] == "value_sbp"].pivot_table(
-            index="time",
-            values="value",
-            aggfunc="last"
-        ).rename(columns={"value": "sbp"})
+    if df.empty:
+        return {}
 
-        dbp = df[df["field"] == "value_dbp"].pivot_table(
-            index="time",
-            values="value",
-            aggfunc="last"
-        ).rename(columns={"value": "dbp"})
+    df["_time"] = pd.to_datetime(df["_time"], utc=True, format="ISO8601")
+    df = df.rename(columns={"_time": "time"}).set_index("time")
 
-        data = base.join([sbp, dbp], how="outer").reset_index()
+    # hr_value -> hr, bp_value_sbp -> sbp, bp_value_dbp -> dbp
+    columns = {}
+    for c in df.columns:
+        if c.endswith("_value"):
+            columns[c] = c[:-len("_value")]
+        elif "_value_" in c:
+            columns[c] = c.split("_value_", 1)[1]
+    df = df.rename(columns=columns)
 
-        if "sbp" in data.columns and "dbp" in data.columns:
-            data["map"] = (data["sbp"] + 2 * data["dbp"]) / 3
-        else:
-            data["map"] = None
+    # Colonne di sensori che il paziente non ha: assenti, come nella query singola
+    frames = {}
+    for patient_id, patient_wide in df.groupby("patient_id", sort=False):
+        patient_wide = patient_wide.drop(columns="patient_id").dropna(axis=1, how="all")
+        frames[patient_id] = patient_wide[wide_columns(patient_wide.columns)]
+    return frames
 
-        for m in METRICS:
-            if m not in data.columns:
-                data[m] = None
 
-        data = data.sort_values("time").reset_index(drop=True)
+def query_baseline_stats(query: str) -> dict[str, pd.DataFrame]:
+    response = query_api.query_raw(query, dialect=CSV_DIALECT)
+    try:
+        return baseline_stats_from_csv(response)
+    finally:
+        response.close()
 
-        for m in METRICS:
-            data[f"time_{m}"] = data["time"]
 
-        for m in METRICS:
-            data[f"time_{m}"] = data["time"]
+def baseline_stats_from_csv(source) -> dict[str, pd.DataFrame]:
+    """
+    Unisce i rollup orari di build_stats_query con la formula della varianza
+    in parallelo: M2 = somma degli M2 orari + somma di n_i * (media_i - media)^2.
+    Ogni M2 orario e' calcolato sulla sua ora, per limitare la cancellazione
+    numerica di somma dei quadrati - quadrato della somma.
+    """
+    try:
+        df = pd.read_csv(source, dtype={"patient_id": str, "sensor": str, "_field": str})
+    except pd.errors.EmptyDataError:
+        return {}
 
-        
+    df = df[df["count"] > 0]
+    if df.empty:
+        return {}
 
-        data = data.drop(columns=["time"])
-            
-        return compact_dataframe(data)
+    # value -> sensore, value_sbp -> sbp, value_map -> map
+    field = df["_field"].str.removeprefix("value").str.removeprefix("_")
+    df = df.assign(metric=field.where(field != "", df["sensor"]))
 
+    df["mean"] = df["sum"] / df["count"]
+    df["m2"] = (df["sumsq"] - df["sum"] * df["mean"]).clip(lower=0)
 
-    except Exception as e:
-        print(f"[Influx read_data error] {e}")
-        import traceback
-        traceback.print_exc()
-        return pd.DataFrame()
-
-def compact_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    non_nan_counts = df.notna().sum()
-    
-    min_count = non_nan_counts.min()
-    compacted = pd.DataFrame({
-        col: df[col].dropna().iloc[:min_count].values
-        for col in df.columns
+    grouped = df.groupby(["patient_id", "metric"], sort=False)
+    total_mean = grouped["sum"].transform("sum") / grouped["count"].transform("sum")
+    df["spread"] = df["count"] * (df["mean"] - total_mean) ** 2
+
+    grouped = df.groupby(["patient_id", "metric"], sort=False)
+    count = grouped["count"].sum()
+    mean = grouped["sum"].sum() / count
+    m2 = grouped["m2"].sum() + grouped["spread"].sum()
+
+    stats = pd.DataFrame({
+        "count": count,
+        "mean": mean,
+        "var": (m2 / (count - 1)).where(count > 1)
     })
-    
-    return compacted
+
+    return {
+        patient_id: patient_stats.droplevel("patient_id")
+        for patient_id, patient_stats in stats.groupby(level="patient_id", sort=False)
+    }
+
+
+def to_analyzer_frame(wide: pd.DataFrame) -> pd.DataFrame:
+    """Dal formato wide al DataFrame atteso dall'Analyzer (map e colonne time_*)"""
+    times, values = align_samples(wide)
+    data = pd.DataFrame(values, columns=METRICS, copy=False)
+
+    time_index = pd.DatetimeIndex(times, tz="UTC")
+    for m in METRICS:
+        data[f"time_{m}"] = time_index
+
+    return data
+
+
+def align_samples(
+    wide: pd.DataFrame,
+    step_seconds: float = ALIGN_STEP_SECONDS,
+    staleness_seconds: float = ALIGN_STALENESS_SECONDS
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Riallinea i sensori su una griglia comune di passo step_seconds, che
+    termina all'ultimo campione ricevuto.
+
+    Per ogni punto della griglia prende l'ultimo valore di ogni sensore
+    (as-of, con searchsorted sui tempi ordinati); i punti in cui un sensore
+    non ha campioni da piu' di staleness_seconds vengono scartati.
+    Restituisce i tempi della griglia (ns, int64) e una matrice float
+    (una riga per tempo, colonne nell'ordine di METRICS, map calcolata da sbp e dbp).
+    """
+    sensors = METRICS[:-1]
+    if wide.empty or any(m not in wide.columns for m in sensors):
+        return np.empty(0, dtype=np.int64), np.empty((0, len(METRICS)))
+
+    wide = wide.sort_index()
+    times = wide.index.as_unit("ns").asi8
+
+    samples = []
+    for m in sensors:
+        values = wide[m].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return np.empty(0, dtype=np.int64), np.empty((0, len(METRICS)))
+        samples.append((times[valid], values[valid]))
+
+    # dal primo istante in cui tutti i sensori hanno almeno un campione
+    start = max(t[0] for t, _ in samples)
+    end = max(t[-1] for t, _ in samples)
+    step = int(step_seconds * 1e9)
+    grid = end - step * np.arange((end - start) // step + 1, dtype=np.int64)[::-1]
+
+    staleness = int(staleness_seconds * 1e9)
+    aligned = np.empty((len(grid), len(METRICS)))
+    for j, (t, values) in enumerate(samples):
+        idx = np.searchsorted(t, grid, side="right") - 1
+        aligned[:, j] = values[idx]
+        aligned[grid - t[idx] > staleness, j] = np.nan
+
+    sbp, dbp = METRICS.index("sbp"), METRICS.index("dbp")
+    aligned[:, -1] = (aligned[:, sbp] + 2 * aligned[:, dbp]) / 3
+
+    fresh = ~np.isnan(aligned).any(axis=1)
+    return grid[fresh], aligned[fresh]
+
+
+class WindowCache:
+    """
+    Finestra "calda" per paziente, mantenuta in memoria.
+
+    Alla prima lettura scarica l'intera finestra; dalle successive chiede a
+    Influx solo i campioni a partire dall'ultimo timestamp ricevuto (meno un
+    margine, per i punti che Telegraf scrive in ritardo), li fonde nella
+    finestra ed elimina quelli piu' vecchi dell'orizzonte.
+
+    L'inizio della query delta non va mai oltre l'orizzonte, e un paziente
+    la cui finestra si svuota (silenzioso o dimesso) torna "nuovo": non
+    trascina indietro la query degli altri pazienti del gruppo.
+    """
+
+    def __init__(self, minutes: int = 5, measurement: str = "vitals_state", overlap_seconds: float = 30):
+        self.minutes = minutes
+        self.measurement = measurement
+        self.horizon = pd.Timedelta(minutes=minutes)
+        self.overlap = pd.Timedelta(seconds=overlap_seconds)
+        self.windows: dict[str, pd.DataFrame] = {}
+        self.last_ts: dict[str, pd.Timestamp] = {}
+        self.lock = threading.Lock()
+
+    def read(self, patient_id: str) -> pd.DataFrame:
+        """Come read_data(patient_id, minutes=self.minutes), con query delta"""
+        return self.read_many([patient_id]).get(patient_id, pd.DataFrame())
+
+    def read_many(self, patient_ids: list[str]) -> dict[str, pd.DataFrame]:
+        """Aggiorna le finestre di piu' pazienti con una sola query delta"""
+        new = {}
+        for query in self.delta_queries(patient_ids):
+            try:
+                new.update(query_wide_by_patient(query))
+            except Exception as e:
+                print(f"[Influx read_data error] {e}")
+
+        return self.merge(patient_ids, new)
+
+    async def read_many_async(self, patient_ids: list[str]) -> dict[str, pd.DataFrame]:
+        """Come read_many, senza bloccare l'event loop"""
+        new = {}
+        for query in self.delta_queries(patient_ids):
+            try:
+                new.update(await query_wide_by_patient_async(query))
+            except Exception as e:
+                print(f"[Influx read_data error] {e}")
+
+        return await asyncio.get_running_loop().run_in_executor(None, self.merge, patient_ids, new)
+
+    def delta_queries(self, patient_ids: list[str], now: pd.Timestamp | None = None) -> list[str]:
+        """
+        Una query dell'intera finestra per i pazienti nuovi e una query delta
+        per gli altri, dal piu' vecchio ultimo timestamp (meno il margine)
+        ma non prima dell'orizzonte
+        """
+        with self.lock:
+            last = {patient_id: self.last_ts.get(patient_id) for patient_id in patient_ids}
+        fresh = [patient_id for patient_id, ts in last.items() if ts is None]
+        known = [patient_id for patient_id, ts in last.items() if ts is not None]
+
+        queries = []
+        if fresh:
+            queries.append(self.query(fresh, f'|> range(start: -{self.minutes}m)'))
+        if known:
+            now = now if now is not None else pd.Timestamp.now(tz="UTC")
+            start = max(min(last[patient_id] for patient_id in known) - self.overlap, now - self.horizon)
+            queries.append(self.query(known, f'|> range(start: {flux_time(start)})'))
+        return queries
+
+    def query(self, patient_ids: list[str], range_clause: str) -> str:
+        return build_query(
+            patient_ids[0] if len(patient_ids) == 1 else patient_ids,
+            range_clause,
+            self.measurement
+        )
+
+    def merge(self, patient_ids: list[str], new: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+        """Fonde il risultato di una query nelle finestre e restituisce i DataFrame per l'Analyzer"""
+        frames = {}
+        for patient_id in patient_ids:
+            window = self.update(patient_id, new.get(patient_id, pd.DataFrame()))
+            frames[patient_id] = pd.DataFrame() if window.empty else to_analyzer_frame(window)
+        return frames
+
+    def frame(self, patient_id: str) -> pd.DataFrame:
+        """Finestra corrente del paziente per l'Analyzer, senza interrogare Influx"""
+        window = self.update(patient_id, pd.DataFrame())
+        return pd.DataFrame() if window.empty else to_analyzer_frame(window)
+
+    def update(self, patient_id: str, new: pd.DataFrame, now: pd.Timestamp | None = None) -> pd.DataFrame:
+        """Fonde i nuovi campioni wide nella finestra del paziente ed applica l'eviction"""
+        with self.lock:
+            window = self.windows.get(patient_id)
+
+            if not new.empty:
+                # A parita' di timestamp prevalgono i valori appena letti
+                window = new if window is None or window.empty else new.combine_first(window)
+                window = window[wide_columns(window.columns)]
+                last_ts = window.index.max()
+                if patient_id not in self.last_ts or last_ts > self.last_ts[patient_id]:
+                    self.last_ts[patient_id] = last_ts
+
+            if window is None:
+                return pd.DataFrame()
+
+            now = now if now is not None else pd.Timestamp.now(tz="UTC")
+            window = window[window.index >= now - self.horizon]
+            self.windows[patient_id] = window
+            if window.empty:
+                # alla prossima lettura si riparte dall'intera finestra
+                self.last_ts.pop(patient_id, None)
+
+            return window
+
+
+def wide_columns(columns) -> list:
+    """Ordine delle colonne di query_wide_by_patient: sensori in ordine alfabetico, poi sbp e dbp"""
+    pressure = [c for c in ("sbp", "dbp") if c in columns]
+    return sorted(c for c in columns if c not in pressure) + pressure
+
+
+def flux_time(ts: pd.Timestamp) -> str:
+    """Timestamp come letterale RFC3339 per Flux"""
+    ts = pd.Timestamp(ts)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def write_lines(lines: list[str], bucket: str = INFLUX_BUCKET):
+    """Scrive punti in line protocol (timestamp in nanosecondi)"""
+    global write_api
+    if write_api is None:
+        write_api = influx_client.write_api(write_options=SYNCHRONOUS)
+    write_api.write(bucket=bucket, org=INFLUX_ORG, record=lines)
+
 
 def close_connection():
     if influx_client:
         influx_client.close()
         print("InfluxDB closed")
+
+
+async def open_async_connection():
+    """
+    Apre il client asincrono (va creato dentro l'event loop).
+    Senza influxdb-client[async] le query asincrone girano nell'executor.
+    """
+    global async_client
+    if InfluxDBClientAsync is None:
+        print("influxdb-client[async] not installed, running queries in the executor")
+        return None
+    if async_client is None:
+        async_client = InfluxDBClientAsync(
+            url=INFLUX_URL,
+            token=INFLUX_TOKEN,
+            org=INFLUX_ORG
+        )
+    return async_client
+
+
+async def close_async_connection():
+    global async_client
+    if async_client is not None:
+        await async_client.close()
+        async_client = None
+        print("InfluxDB async client closed")
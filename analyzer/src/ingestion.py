@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from handlers.mqtt_handler import MQTTHandler
+from influx_handler import WindowCache, wide_columns
+
+STATES_TOPICS_PREFIX = os.getenv("STATES_TOPICS_PREFIX", "acrss/states")
+
+
+class VitalsIngestor:
+    """
+    Ingestione push dei parametri vitali.
+
+    Si sottoscrive a acrss/states/+/+, o ai soli topic dei pazienti indicati
+    (gli stessi messaggi che Telegraf scrive su Influx) e inserisce i campioni
+    nelle finestre in memoria di WindowCache.
+    Influx resta usato solo per riempire la finestra all'avvio e per i buchi,
+    cioe' quando per un paziente non arrivano messaggi da piu' di gap_seconds.
+    """
+
+    def __init__(
+        self,
+        cache: WindowCache,
+        gap_seconds: float = 10,
+        client_id: str = "analyzer_ingestion",
+        patient_ids: list[str] | None = None
+    ):
+        self.cache = cache
+        self.gap_seconds = gap_seconds
+        self.client_id = client_id
+        self.patient_ids = patient_ids  # None: tutti i pazienti
+        self.client = None
+
+        # campioni ricevuti e non ancora inseriti nella finestra: patient_id -> [(time, colonna, valore)]
+        self.pending: dict[str, list] = {}
+        self.last_push: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.patient_ids is None:
+            topics = f"{STATES_TOPICS_PREFIX}/+/+"
+        else:
+            topics = [f"{STATES_TOPICS_PREFIX}/{patient_id}/+" for patient_id in self.patient_ids]
+
+        self.client = MQTTHandler.get_client(
+            client_id=self.client_id,
+            username=os.getenv("MQTT_USER"),
+            password=os.getenv("MQTT_PASSWORD"),
+            subscribe_topics=topics
+        )
+        MQTTHandler.set_on_message(self.client, self.on_message)
+        MQTTHandler.connect(self.client, blocking=False)
+
+    def stop(self):
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+
+    def on_message(self, client, userdata, message):
+        # acrss/states/{patient_id}/{sensor}
+        try:
+            patient_id, sensor = message.topic.split("/")[-2:]
+            payload = json.loads(message.payload.decode())
+            ts = pd.Timestamp(payload["ts"], unit="ms", tz="UTC")
+            value = payload["value"]
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"[{self.client_id.upper()}]: Invalid vitals message on {message.topic}: {e}")
+            return
+
+        # La pressione arriva come {"sbp": ..., "dbp": ...}, come value_sbp/value_dbp in Influx
+        fields = value.items() if isinstance(value, dict) else [(sensor, value)]
+        samples = []
+        for column, v in fields:
+            try:
+                samples.append((ts, column, float(v)))
+            except (ValueError, TypeError) as e:
+                print(f"[{self.client_id.upper()}]: Invalid {column} value on {message.topic}: {e}")
+        if not samples:
+            return
+
+        with self.lock:
+            self.pending.setdefault(patient_id, []).extend(samples)
+            self.last_push[patient_id] = time.monotonic()
+
+    def flush(self):
+        """Inserisce nelle finestre i campioni ricevuti dall'ultima chiamata"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        for patient_id, samples in pending.items():
+            new = pd.DataFrame(samples, columns=["time", "sensor", "value"]).pivot_table(
+                index="time",
+                columns="sensor",
+                values="value",
+                aggfunc="last"
+            )
+            new.columns.name = None
+            self.cache.update(patient_id, new[wide_columns(new.columns)])
+
+    def read_many(self, patient_ids: list[str]) -> dict[str, pd.DataFrame]:
+        """
+        Finestre per l'Analyzer alimentate da MQTT. I pazienti senza finestra
+        o senza messaggi recenti vengono recuperati da Influx con una query delta.
+        """
+        self.flush()
+
+        now = time.monotonic()
+        backfill = [
+            patient_id for patient_id in patient_ids
+            if patient_id not in self.cache.last_ts
+            or now - self.last_push.get(patient_id, float("-inf")) > self.gap_seconds
+        ]
+
+        frames = self.cache.read_many(backfill) if backfill else {}
+        for patient_id in patient_ids:
+            if patient_id not in frames:
+                frames[patient_id] = self.cache.frame(patient_id)
+        return frames
+
+    def read(self, patient_id: str) -> pd.DataFrame:
+        return self.read_many([patient_id])[patient_id]
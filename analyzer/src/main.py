@@ -1,12 +1,24 @@
 from handlers.mqtt_handler import MQTTHandler
-from analyzer import Analyzer
+from analyzer import Analyzer, METRICS
 import threading
+import multiprocessing
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import time
 import pandas as pd
 from datetime import datetime
 from datetime import timedelta
 import os
-from influx_handler import read_data, close_connection
+from pathlib import Path
+from influx_handler import read_data, read_data_bulk, close_connection, WindowCache
+from influx_handler import read_data_bulk_async, open_async_connection, close_async_connection
+from influx_handler import read_baseline_stats, read_baseline_stats_async, write_lines
+from ingestion import VitalsIngestor
+from config_loader import current_rules, RulesWatcher
+from checkpoint import BaselineStore, CheckpointWriter
+from metrics import metrics, MetricsWriter
+from publishing import SymptomFilter
+from scheduling import AnalysisScheduler
 
 MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 
@@ -14,6 +26,76 @@ MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 PATIENTS_NUMBER = int(os.getenv("PATIENTS_NUMBER", 1))
 PATIENT_IDS = [str(i + 1) for i in range(PATIENTS_NUMBER)]
 
+# filtro EWMA: "batch" (vettoriale), "rows" (riga per riga, di riferimento)
+# oppure "incremental" (solo i campioni nuovi, stato mantenuto tra i cicli)
+FILTER_MODE = os.getenv("ANALYZER_FILTER_MODE", "batch")
+
+# lettura della finestra: "delta" (cache in memoria + query incrementali) oppure "full"
+READ_MODE = os.getenv("ANALYZER_READ_MODE", "delta")
+DELTA_OVERLAP_SECONDS = float(os.getenv("ANALYZER_DELTA_OVERLAP_SECONDS", 30))
+
+# esecuzione: "threads" (un thread e un client MQTT per paziente),
+# "ward" (un solo thread, una query per tick per tutti i pazienti),
+# "processes" (pazienti divisi tra ANALYZER_WORKERS processi, ognuno come "ward"),
+# "asyncio" (una coroutine per paziente in un solo event loop) oppure
+# "scheduler" (ANALYZER_WORKERS thread, cadenza di ogni paziente secondo l'acuzie)
+RUNTIME = os.getenv("ANALYZER_RUNTIME", "threads")
+WORKERS = int(os.getenv("ANALYZER_WORKERS", os.cpu_count() or 1))
+WORKER_RESTART_SECONDS = float(os.getenv("ANALYZER_WORKER_RESTART_SECONDS", 5))
+
+# runtime asyncio: thread dell'executor per il calcolo e query Influx concorrenti
+ASYNC_WORKERS = int(os.getenv("ANALYZER_ASYNC_WORKERS", os.cpu_count() or 1))
+ASYNC_QUERIES = int(os.getenv("ANALYZER_ASYNC_QUERIES", 16))
+
+# runtime scheduler: secondi tra due analisi per livello di acuzie
+# (vedi scheduling.acuity), mai oltre ANALYZER_SCHEDULE_MAX_SECONDS
+SCHEDULE_INTERVALS = {
+    "critical": float(os.getenv("ANALYZER_SCHEDULE_CRITICAL_SECONDS", 1)),
+    "watch": float(os.getenv("ANALYZER_SCHEDULE_WATCH_SECONDS", 2)),
+    "stable": float(os.getenv("ANALYZER_SCHEDULE_STABLE_SECONDS", 5)),
+}
+SCHEDULE_MAX_SECONDS = float(os.getenv("ANALYZER_SCHEDULE_MAX_SECONDS", 10))
+
+# ingestione: "poll" (finestre lette da Influx) oppure "mqtt" (campioni ricevuti
+# da acrss/states, Influx solo per avvio e buchi)
+INGESTION = os.getenv("ANALYZER_INGESTION", "poll")
+INGESTION_GAP_SECONDS = float(os.getenv("ANALYZER_INGESTION_GAP_SECONDS", 10))
+
+# media dell'ultimo minuto per le regole cliniche: "rolling" (aggregatore
+# incrementale per paziente) oppure "frame" (compute_agg_from_raw sulla finestra)
+AGGREGATION = os.getenv("ANALYZER_AGGREGATION", "rolling")
+
+# controllo delle modifiche a clinical_rules.ini (secondi, 0 = disattivato)
+RULES_RELOAD_SECONDS = float(os.getenv("ANALYZER_RULES_RELOAD_SECONDS", 5))
+
+# checkpoint delle baseline su file, ripristinato all'avvio (secondi, 0 = disattivato)
+CHECKPOINT_PATH = os.getenv(
+    "ANALYZER_CHECKPOINT_PATH",
+    str(Path(__file__).resolve().parent.parent / "state" / "baselines.npy")
+)
+CHECKPOINT_SECONDS = float(os.getenv("ANALYZER_CHECKPOINT_SECONDS", 60))
+# checkpoint piu' vecchi di cosi' (secondi) vengono ignorati: baseline dallo storico (0 = nessun limite)
+CHECKPOINT_MAX_AGE_SECONDS = float(os.getenv("ANALYZER_CHECKPOINT_MAX_AGE_SECONDS", 3600))
+
+# bootstrap della baseline: "stats" (media e varianza calcolate da Influx sulle
+# ultime ANALYZER_BASELINE_LOOKBACK_HOURS ore) oppure "history" (storico scaricato)
+BASELINE_SOURCE = os.getenv("ANALYZER_BASELINE_SOURCE", "stats")
+BASELINE_LOOKBACK_HOURS = float(os.getenv("ANALYZER_BASELINE_LOOKBACK_HOURS", 24))
+
+# metriche del ciclo (durata delle fasi, ritardo, cicli saltati) scritte in
+# Influx ogni ANALYZER_METRICS_SECONDS secondi (0 = disattivate)
+METRICS_SECONDS = float(os.getenv("ANALYZER_METRICS_SECONDS", 0))
+
+# pubblicazione dei sintomi: "always" (ogni ciclo) oppure "changes" (solo
+# quando cambia la classificazione, piu' un keyframe ogni
+# ANALYZER_KEYFRAME_SECONDS secondi per paziente)
+PUBLISH_MODE = os.getenv("ANALYZER_PUBLISH_MODE", "always")
+KEYFRAME_SECONDS = float(os.getenv("ANALYZER_KEYFRAME_SECONDS", 30))
+
+window_cache = WindowCache(minutes=5, overlap_seconds=DELTA_OVERLAP_SECONDS)
+ingestor = VitalsIngestor(window_cache, gap_seconds=INGESTION_GAP_SECONDS)
+symptom_filter = SymptomFilter(mode=PUBLISH_MODE, keyframe_seconds=KEYFRAME_SECONDS)
+
 """therapy_old = {
     'ox_therapy': 0,
     'fluids': None,
@@ -57,6 +139,171 @@ def compute_agg_from_raw(raw_data, window_seconds=60):
     return agg_df
 
 
+def read_windows(patient_ids):
+    """Finestre di 5 minuti per l'Analyzer, dalla sorgente configurata"""
+    if INGESTION == "mqtt":
+        return ingestor.read_many(patient_ids)
+    if READ_MODE == "delta":
+        return window_cache.read_many(patient_ids)
+    return read_data_bulk(patient_ids, minutes=5)
+
+
+def read_window(patient_id):
+    if INGESTION == "mqtt":
+        return ingestor.read(patient_id)
+    if READ_MODE == "delta":
+        return window_cache.read(patient_id)
+    return read_data(patient_id=patient_id, minutes=5)
+
+
+async def read_window_async(patient_id):
+    """Come read_window, senza bloccare l'event loop"""
+    if INGESTION == "mqtt":
+        return await asyncio.get_running_loop().run_in_executor(None, ingestor.read, patient_id)
+    if READ_MODE == "delta":
+        frames = await window_cache.read_many_async([patient_id])
+    else:
+        frames = await read_data_bulk_async([patient_id], minutes=5)
+    return frames.get(patient_id, pd.DataFrame())
+
+
+def read_histories(patient_ids):
+    """Dati per bootstrap_baseline, dalla sorgente configurata"""
+    if BASELINE_SOURCE == "stats":
+        return read_baseline_stats(patient_ids, hours=BASELINE_LOOKBACK_HOURS)
+    return read_data_bulk(patient_ids, full_history=True)
+
+
+async def read_histories_async(patient_ids):
+    """Come read_histories, senza bloccare l'event loop"""
+    if BASELINE_SOURCE == "stats":
+        return await read_baseline_stats_async(patient_ids, hours=BASELINE_LOOKBACK_HOURS)
+    return await read_data_bulk_async(patient_ids, full_history=True)
+
+
+def bootstrap_baseline(patient_id, analyzer, history):
+    """Inizializza la baseline dai dati storici (se completi) o dalle statistiche di Influx"""
+    # paziente nuovo, ancora senza dati: par_initialized resta False
+    if history.empty or (BASELINE_SOURCE == "stats" and "var" not in history.columns):
+        return
+
+    if BASELINE_SOURCE == "stats":
+        stats = history.reindex(METRICS)
+        if not stats["var"].isna().any():
+            analyzer.initialize_baseline_stats(stats["mean"].to_dict(), stats["var"].to_dict())
+            analyzer.par_initialized = True
+        return
+
+    if history.isna().any().any():
+        print(f"[{patient_id}] Baseline initialized")
+    else:
+        analyzer.initialize_baseline(history)
+        analyzer.par_initialized = True
+
+
+def analyze(patient_id, analyzer, raw_data):
+    """
+    Un ciclo di analisi sulla finestra raw_data.
+    Restituisce il messaggio da pubblicare, o None se i dati non bastano.
+    """
+    if raw_data.empty:
+        print(f"[{patient_id}] No data available, waiting...")
+        metrics.skip(patient_id, "no_data")
+        return None
+
+    # ---- EWMA, trend & slope ----
+    with metrics.stage("filter"):
+        if FILTER_MODE == "incremental":
+            analyzer.update_stream(raw_data)
+            trend = analyzer.stream_trend()
+            slope = analyzer.stream_slope()
+        else:
+            if FILTER_MODE == "batch":
+                # lento e veloce in un solo passaggio, baseline aggiornata una volta
+                filtered = analyzer.filter_EWMA_rates(raw_data)
+                data_slow_filtered = filtered["slow"]
+                data_fast_filtered = filtered["fast"]
+            else:
+                data_slow_filtered = analyzer.filter_EWMA(raw_data.copy())
+                data_fast_filtered = analyzer.filter_EWMA(
+                    raw_data.copy(),
+                    alpha_min=0.2,
+                    alpha_max=0.3
+                )
+
+            trend = analyzer.calculate_trend(data_slow_filtered)
+            slope = analyzer.calculate_slope(
+                raw_data,
+                data_slow_filtered,
+                data_fast_filtered
+            )
+
+    # baseline aggiornata dal filtro: la copia per il CheckpointWriter si prende qui
+    analyzer.take_checkpoint()
+
+    metric_trend = analyzer.classify_trend(trend)
+    slope_trend = analyzer.classify_all_slopes(slope)
+
+    #therapy = therapy_old
+
+    # un solo snapshot delle soglie per tutto il ciclo
+    rules = current_rules()
+
+    with metrics.stage("status"):
+        if AGGREGATION == "rolling":
+            analyzer.update_aggregate(raw_data)
+            agg_inputs = analyzer.aggregate_inputs()
+
+            if agg_inputs is None:
+                print(f"[{patient_id}] Not enough data for aggregation yet")
+                metrics.skip(patient_id, "no_aggregate")
+                return None
+
+            status = analyzer.classify_inputs(agg_inputs, rules)
+        else:
+            agg_data = compute_agg_from_raw(raw_data, window_seconds=60)
+
+            if agg_data.empty:
+                print(f"[{patient_id}] Not enough data for aggregation yet")
+                metrics.skip(patient_id, "no_aggregate")
+                return None
+
+            #status = analyzer.generate_status(agg_data, therapy)
+            status = analyzer.generate_status(agg_data, rules)
+
+    """analyzer.hypoxia_starting_time = (
+        int(analyzer.clock())
+        if status['oxigenation'] not in analyzer.hypoxia_status
+        else analyzer.hypoxia_starting_time
+    )"""
+
+    analyzer.hypoxia_starting_time = (
+        int(analyzer.clock())
+        if status['oxigenation'] in analyzer.hypoxia_status
+        else 0
+    )
+
+    ts_ms = int(analyzer.clock() * 1000)
+    
+    return {
+        'timestamp': ts_ms,
+        'status': status,
+        'trend': metric_trend,
+        'intensity': slope_trend,
+        'rules_version': rules.version
+    }
+
+
+def publishable(patient_id, status_patient):
+    """Il messaggio da pubblicare (con seq), o None se la classificazione non e' cambiata"""
+    if status_patient is None:
+        return None
+    message = symptom_filter.filter(patient_id, status_patient)
+    if message is None:
+        metrics.skip(patient_id, "unchanged")
+    return message
+
+
 def analysis_loop(patient_id, analyzer):
 
     publish_topic = f"acrss/symptoms/{patient_id}"
@@ -75,118 +322,521 @@ def analysis_loop(patient_id, analyzer):
 
     MQTTHandler.connect(client, blocking=False)
 
+    raw_data = pd.DataFrame()
+    last_tick = None
+
     try:
         while True:
             time.sleep(1)
 
+            tick = time.monotonic()
+            if last_tick is not None:
+                metrics.lag(patient_id, tick - last_tick - 1)
+            last_tick = tick
+
             # ============================
             # BOOTSTRAP (una sola volta)
             # ============================
             if not analyzer.par_initialized:
                 print(f"[{patient_id}] Initializing baseline")
 
-                raw_data = read_data(
-                    patient_id=patient_id,
-                    full_history=True
-                )
+                raw_data = read_histories([patient_id]).get(patient_id, pd.DataFrame())
+                bootstrap_baseline(patient_id, analyzer, raw_data)
 
-                if raw_data.isna().any().any():    
-                    print(f"[{patient_id}] Baseline initialized")
-                else:
-                    analyzer.initialize_baseline(raw_data)
-                    analyzer.par_initialized = True
+                if not analyzer.par_initialized:
+                    print(f"[{patient_id}] No historical data yet, waiting...")
+                    metrics.skip(patient_id, "no_history")
+                    continue
 
             if raw_data.isna().any().any():
                     print(f"[{patient_id}] No historical data yet, waiting...")
+                    metrics.skip(patient_id, "no_history")
                     continue
             # ============================
             # RUNTIME
             # ============================
-            raw_data = read_data(
-                patient_id=patient_id,
-                minutes=5
-            )
+            with metrics.stage("read"):
+                raw_data = read_window(patient_id)
 
-            if raw_data.empty:
-                print(f"[{patient_id}] No data available, waiting...")
+            status_patient = publishable(patient_id, analyze(patient_id, analyzer, raw_data))
+            if status_patient is None:
                 continue
-            
-            # ---- EWMA ----
-            data_slow_filtered = analyzer.filter_EWMA(raw_data.copy())
-            data_fast_filtered = analyzer.filter_EWMA(
-                raw_data.copy(),
-                alpha_min=0.2,
-                alpha_max=0.3
-            )
 
-            # ---- trend & slope ----
-            trend = analyzer.calculate_trend(data_slow_filtered)
-            metric_trend = analyzer.classify_trend(trend)
-            
-            slope = analyzer.calculate_slope(
-                raw_data,
-                data_slow_filtered,
-                data_fast_filtered
-            )
-            slope_trend = analyzer.classify_all_slopes(slope)
+            with metrics.stage("publish"):
+                MQTTHandler.publish(
+                    client,
+                    [(publish_topic, status_patient)]
+                )
+    except KeyboardInterrupt:
+        print(f"[{patient_id}] Interrupted by user")
+    except Exception as e:
+        print(f"[{patient_id}] Unexpected error: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        client.loop_stop()
+        client.disconnect()
 
-            #therapy = therapy_old
 
-            agg_data = compute_agg_from_raw(raw_data, window_seconds=60)
+def ward_loop(patient_ids, analyzers, client_id="analyzer"):
+    """
+    Analizza un gruppo di pazienti in un solo thread: a ogni tick una sola
+    query per tutte le finestre (ed una per le baseline mancanti) ed un solo
+    client MQTT.
+    """
+    username = os.getenv("MQTT_USER")
+    password = os.getenv("MQTT_PASSWORD")
 
+    client = MQTTHandler.get_client(
+        client_id=client_id,
+        username=username,
+        password=password,
+        subscribe_topics=None
+    )
 
-            if agg_data.empty:
-                print(f"[{patient_id}] Not enough data for aggregation yet")
+    MQTTHandler.connect(client, blocking=False)
+
+    # ultimo DataFrame visto per paziente (storico o finestra), come raw_data in analysis_loop
+    last_data = {patient_id: pd.DataFrame() for patient_id in patient_ids}
+    last_tick = None
+
+    try:
+        while True:
+            time.sleep(1)
+
+            # stesso ritardo per tutti i pazienti del gruppo
+            tick = time.monotonic()
+            if last_tick is not None:
+                for patient_id in patient_ids:
+                    metrics.lag(patient_id, tick - last_tick - 1)
+            last_tick = tick
+
+            # ---- BOOTSTRAP dei pazienti senza baseline ----
+            pending = [p for p in patient_ids if not analyzers[p].par_initialized]
+            if pending:
+                print(f"[{client_id}] Initializing baseline for {len(pending)} patients")
+                histories = read_histories(pending)
+                for patient_id in pending:
+                    last_data[patient_id] = histories.get(patient_id, pd.DataFrame())
+                    bootstrap_baseline(patient_id, analyzers[patient_id], last_data[patient_id])
+
+            ready = []
+            for patient_id in patient_ids:
+                if not analyzers[patient_id].par_initialized or last_data[patient_id].isna().any().any():
+                    print(f"[{patient_id}] No historical data yet, waiting...")
+                    metrics.skip(patient_id, "no_history")
+                    continue
+                ready.append(patient_id)
+
+            if not ready:
                 continue
 
-            #status = analyzer.generate_status(agg_data, therapy)
-            status = analyzer.generate_status(agg_data)
-
-            """analyzer.hypoxia_starting_time = (
-                int(datetime.now().timestamp())
-                if status['oxigenation'] not in analyzer.hypoxia_status
-                else analyzer.hypoxia_starting_time
-            )"""
-
-            analyzer.hypoxia_starting_time = (
-                int(datetime.now().timestamp())
-                if status['oxigenation'] in analyzer.hypoxia_status
-                else 0
-            )
+            # ---- RUNTIME: una query per tutti i pazienti ----
+            with metrics.stage("read"):
+                frames = read_windows(ready)
+
+            messages = []
+            for patient_id in ready:
+                raw_data = frames.get(patient_id, pd.DataFrame())
+                last_data[patient_id] = raw_data
+
+                try:
+                    status_patient = publishable(patient_id, analyze(patient_id, analyzers[patient_id], raw_data))
+                except Exception as e:
+                    print(f"[{patient_id}] Unexpected error: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    metrics.skip(patient_id, "error")
+                    continue
 
-            ts_ms = int(datetime.now().timestamp() * 1000)
-            
-            status_patient = {
-                'timestamp': ts_ms,
-                'status': status,
-                'trend': metric_trend,
-                'intensity': slope_trend
-            }
-            MQTTHandler.publish(
-                client,
-                [(publish_topic, status_patient)]
-            )
+                if status_patient is not None:
+                    messages.append((f"acrss/symptoms/{patient_id}", status_patient))
+
+            if messages:
+                with metrics.stage("publish"):
+                    MQTTHandler.publish(client, messages)
     except KeyboardInterrupt:
-        print(f"[{patient_id}] Interrupted by user")
-    except Exception as e:
-        print(f"[{patient_id}] Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"[{client_id}] Interrupted by user")
     finally:
         client.loop_stop()
         client.disconnect()
 
 
 
+def scheduled_worker(scheduler, analyzers, last_data, client):
+    """
+    Worker del runtime scheduler: analizza il paziente con la scadenza piu'
+    vicina e lo riprogramma secondo l'acuzie del risultato
+    """
+    while True:
+        task = scheduler.take()
+        if task is None:
+            return
+        patient_id, deadline = task
+        analyzer = analyzers[patient_id]
+        metrics.lag(patient_id, scheduler.clock() - deadline)
+
+        status_patient = None
+        try:
+            # ---- BOOTSTRAP (una sola volta) ----
+            if not analyzer.par_initialized:
+                print(f"[{patient_id}] Initializing baseline")
+                last_data[patient_id] = read_histories([patient_id]).get(patient_id, pd.DataFrame())
+                bootstrap_baseline(patient_id, analyzer, last_data[patient_id])
+
+            if not analyzer.par_initialized or last_data[patient_id].isna().any().any():
+                print(f"[{patient_id}] No historical data yet, waiting...")
+                metrics.skip(patient_id, "no_history")
+                continue
+
+            # ---- RUNTIME ----
+            with metrics.stage("read"):
+                last_data[patient_id] = read_window(patient_id)
+
+            status_patient = analyze(patient_id, analyzer, last_data[patient_id])
+            message = publishable(patient_id, status_patient)
+            if message is not None:
+                with metrics.stage("publish"):
+                    MQTTHandler.publish(client, [(f"acrss/symptoms/{patient_id}", message)])
+        except Exception as e:
+            print(f"[{patient_id}] Unexpected error: {e}")
+            import traceback
+            traceback.print_exc()
+            metrics.skip(patient_id, "error")
+        finally:
+            scheduler.done(patient_id, deadline, status_patient)
+
+
+def scheduled_ward(patient_ids, analyzers, workers, client_id="analyzer"):
+    """
+    Runtime scheduler: un heap di scadenze condiviso da workers thread ed un
+    solo client MQTT. I pazienti critici sono analizzati ogni
+    ANALYZER_SCHEDULE_CRITICAL_SECONDS, quelli stabili piu' di rado.
+    """
+    client = MQTTHandler.get_client(
+        client_id=client_id,
+        username=os.getenv("MQTT_USER"),
+        password=os.getenv("MQTT_PASSWORD"),
+        subscribe_topics=None
+    )
+    MQTTHandler.connect(client, blocking=False)
+
+    scheduler = AnalysisScheduler(patient_ids, SCHEDULE_INTERVALS, SCHEDULE_MAX_SECONDS)
+    last_data = {patient_id: pd.DataFrame() for patient_id in patient_ids}
+    threads = [
+        threading.Thread(
+            target=scheduled_worker,
+            args=(scheduler, analyzers, last_data, client),
+            name=f"analyzer_worker_{i}",
+            daemon=True
+        )
+        for i in range(max(1, workers))
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=1)
+    except KeyboardInterrupt:
+        print(f"[{client_id}] Interrupted by user")
+    finally:
+        scheduler.stop()
+        client.loop_stop()
+        client.disconnect()
+
+
+async def async_analysis_loop(patient_id, analyzer, client, queries):
+    """
+    Come analysis_loop, ma come coroutine: il tick e le query ad Influx non
+    bloccano l'event loop ed il calcolo gira nell'executor.
+    queries limita le query concorrenti verso Influx.
+    """
+    loop = asyncio.get_running_loop()
+    publish_topic = f"acrss/symptoms/{patient_id}"
+    raw_data = pd.DataFrame()
+    last_tick = None
+
+    while True:
+        await asyncio.sleep(1)
+
+        tick = time.monotonic()
+        if last_tick is not None:
+            metrics.lag(patient_id, tick - last_tick - 1)
+        last_tick = tick
+
+        try:
+            # ---- BOOTSTRAP (una sola volta) ----
+            if not analyzer.par_initialized:
+                print(f"[{patient_id}] Initializing baseline")
+
+                async with queries:
+                    histories = await read_histories_async([patient_id])
+                raw_data = histories.get(patient_id, pd.DataFrame())
+                await loop.run_in_executor(None, bootstrap_baseline, patient_id, analyzer, raw_data)
+
+                if not analyzer.par_initialized:
+                    print(f"[{patient_id}] No historical data yet, waiting...")
+                    metrics.skip(patient_id, "no_history")
+                    continue
+
+            if raw_data.isna().any().any():
+                print(f"[{patient_id}] No historical data yet, waiting...")
+                metrics.skip(patient_id, "no_history")
+                continue
+
+            # ---- RUNTIME ----
+            async with queries:
+                with metrics.stage("read"):
+                    raw_data = await read_window_async(patient_id)
+
+            status_patient = await loop.run_in_executor(None, analyze, patient_id, analyzer, raw_data)
+            status_patient = publishable(patient_id, status_patient)
+            if status_patient is None:
+                continue
+
+            with metrics.stage("publish"):
+                MQTTHandler.publish(
+                    client,
+                    [(publish_topic, status_patient)]
+                )
+        except Exception as e:
+            print(f"[{patient_id}] Unexpected error: {e}")
+            import traceback
+            traceback.print_exc()
+            metrics.skip(patient_id, "error")
+
+
+async def async_ward(patient_ids, analyzers, client_id="analyzer"):
+    """
+    Runtime asyncio: un event loop, un client MQTT ed una coroutine per
+    paziente. Il calcolo numerico gira in un pool di ASYNC_WORKERS thread.
+    """
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix="analyzer"))
+    await open_async_connection()
+
+    client = MQTTHandler.get_client(
+        client_id=client_id,
+        username=os.getenv("MQTT_USER"),
+        password=os.getenv("MQTT_PASSWORD"),
+        subscribe_topics=None
+    )
+    MQTTHandler.connect(client, blocking=False)
+
+    queries = asyncio.Semaphore(ASYNC_QUERIES)
+    tasks = [
+        asyncio.create_task(
+            async_analysis_loop(patient_id, analyzers[patient_id], client, queries),
+            name=f"analyzer_{patient_id}"
+        )
+        for patient_id in patient_ids
+    ]
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        client.loop_stop()
+        client.disconnect()
+        await close_async_connection()
+
+
+def start_rules_watcher():
+    if RULES_RELOAD_SECONDS <= 0:
+        return None
+    watcher = RulesWatcher(interval=RULES_RELOAD_SECONDS)
+    watcher.start()
+    print(f"Clinical rules version {current_rules().version}, checking for changes every {RULES_RELOAD_SECONDS}s")
+    return watcher
+
+
+def open_baseline_store(patient_ids):
+    if CHECKPOINT_SECONDS <= 0:
+        return None
+    try:
+        return BaselineStore(CHECKPOINT_PATH, patient_ids, max_age=CHECKPOINT_MAX_AGE_SECONDS or None)
+    except Exception as e:
+        print(f"[CHECKPOINT] Cannot open {CHECKPOINT_PATH}, baselines will not be saved: {e}")
+        return None
+
+
+def new_analyzers(patient_ids, store):
+    """Un Analyzer per paziente, con la baseline ripristinata dal checkpoint se presente"""
+    analyzers = {patient_id: Analyzer() for patient_id in patient_ids}
+    if store is not None:
+        restored = [p for p in patient_ids if store.restore(p, analyzers[p])]
+        if restored:
+            print(f"Restored baseline from checkpoint for patients {', '.join(restored)}")
+    return analyzers
+
+
+def start_checkpoint_writer(store, analyzers):
+    if store is None:
+        return None
+    writer = CheckpointWriter(store, analyzers, interval=CHECKPOINT_SECONDS)
+    writer.start()
+    return writer
+
+
+def stop_checkpoint_writer(writer):
+    if writer is not None:
+        writer.stop()
+
+
+def start_metrics_writer(tags):
+    if METRICS_SECONDS <= 0:
+        return None
+    writer = MetricsWriter(write_lines, interval=METRICS_SECONDS, tags=tags)
+    writer.start()
+    print(f"Writing analyzer metrics to InfluxDB every {METRICS_SECONDS}s")
+    return writer
+
+
+def stop_metrics_writer(writer):
+    if writer is not None:
+        writer.stop()
+
+
+def shard_worker(shard_index, patient_ids):
+    """
+    Processo worker: possiede gli Analyzer dei suoi pazienti e le proprie
+    connessioni a Influx e MQTT
+    """
+    start_rules_watcher()
+    if INGESTION == "mqtt":
+        ingestor.client_id = f"analyzer_ingestion_{shard_index}"
+        ingestor.patient_ids = patient_ids
+        ingestor.start()
+
+    store = open_baseline_store(patient_ids)
+    analyzers = new_analyzers(patient_ids, store)
+    writer = start_checkpoint_writer(store, analyzers)
+    metrics_writer = start_metrics_writer({"runtime": RUNTIME, "shard": shard_index})
+    try:
+        ward_loop(patient_ids, analyzers, client_id=f"analyzer_shard_{shard_index}")
+    finally:
+        stop_metrics_writer(metrics_writer)
+        stop_checkpoint_writer(writer)
+        ingestor.stop()
+        close_connection()
+
+
+def supervise_shards(patient_ids, workers):
+    """
+    Divide i pazienti tra i processi worker e li riavvia se terminano.
+    I processi sono avviati con "spawn": ognuno importa i moduli e apre
+    le proprie connessioni.
+    """
+    context = multiprocessing.get_context("spawn")
+    workers = max(1, min(workers, len(patient_ids)))
+    shards = [patient_ids[i::workers] for i in range(workers)]
+
+    def start(shard_index):
+        process = context.Process(
+            target=shard_worker,
+            args=(shard_index, shards[shard_index]),
+            name=f"analyzer_shard_{shard_index}",
+            daemon=False
+        )
+        process.start()
+        print(f"Started analyzer shard {shard_index} (pid {process.pid}) for patients {', '.join(shards[shard_index])}")
+        return process
+
+    processes = [start(i) for i in range(workers)]
+    restart_at = [None] * workers
+
+    try:
+        while True:
+            time.sleep(1)
+            for i, process in enumerate(processes):
+                if process.is_alive():
+                    continue
+
+                if restart_at[i] is None:
+                    print(f"Analyzer shard {i} exited with code {process.exitcode}, restarting in {WORKER_RESTART_SECONDS}s")
+                    restart_at[i] = time.monotonic() + WORKER_RESTART_SECONDS
+                elif time.monotonic() >= restart_at[i]:
+                    processes[i] = start(i)
+                    restart_at[i] = None
+    except KeyboardInterrupt:
+        print("\nMain process interrupted")
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+
+
 def main():
+    if RUNTIME == "processes":
+        print(f"Starting {WORKERS} analyzer workers")
+        # crea gli slot di tutti i pazienti prima di avviare i worker
+        open_baseline_store(PATIENT_IDS)
+        try:
+            supervise_shards(PATIENT_IDS, WORKERS)
+        finally:
+            print("Shutting down...")
+            close_connection()
+        return
+
+    start_rules_watcher()
+
+    if INGESTION == "mqtt":
+        ingestor.start()
+
+    store = open_baseline_store(PATIENT_IDS)
+    analyzers = new_analyzers(PATIENT_IDS, store)
+    writer = start_checkpoint_writer(store, analyzers)
+    metrics_writer = start_metrics_writer({"runtime": RUNTIME})
+
+    if RUNTIME == "asyncio":
+        print(f"Started asyncio analyzer for {len(PATIENT_IDS)} patients")
+        try:
+            asyncio.run(async_ward(PATIENT_IDS, analyzers))
+        except KeyboardInterrupt:
+            print("\nMain thread interrupted")
+        finally:
+            print("Shutting down...")
+            stop_metrics_writer(metrics_writer)
+            stop_checkpoint_writer(writer)
+            ingestor.stop()
+            close_connection()
+        return
+
+    if RUNTIME == "scheduler":
+        print(f"Started scheduled analyzer for {len(PATIENT_IDS)} patients with {WORKERS} workers")
+        try:
+            scheduled_ward(PATIENT_IDS, analyzers, WORKERS)
+        finally:
+            print("Shutting down...")
+            stop_metrics_writer(metrics_writer)
+            stop_checkpoint_writer(writer)
+            ingestor.stop()
+            close_connection()
+        return
+
+    if RUNTIME == "ward":
+        print(f"Started ward analyzer for {len(PATIENT_IDS)} patients")
+        try:
+            ward_loop(PATIENT_IDS, analyzers)
+        finally:
+            print("Shutting down...")
+            stop_metrics_writer(metrics_writer)
+            stop_checkpoint_writer(writer)
+            ingestor.stop()
+            close_connection()
+        return
+
     threads = []
 
     for patient_id in PATIENT_IDS:
-        analyzer = Analyzer()
-
         thread = threading.Thread(
             target=analysis_loop,
-            args=(patient_id, analyzer),
+            args=(patient_id, analyzers[patient_id]),
             daemon=False
         )
         thread.start()
@@ -202,6 +852,9 @@ def main():
         print("\nMain thread interrupted")
     finally:
         print("Shutting down...")
+        stop_metrics_writer(metrics_writer)
+        stop_checkpoint_writer(writer)
+        ingestor.stop()
         close_connection()
 
 
@@ -0,0 +1,189 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Limiti superiori dei bucket degli istogrammi (secondi)
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10)
+
+
+class Histogram:
+    """Istogramma a bucket fissi: observe O(log bucket), quantili approssimati al limite del bucket"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Limite superiore del bucket che contiene il quantile q (max per l'ultimo bucket)"""
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class StageTimer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class LoopMetrics:
+    """
+    Strumentazione del ciclo di analisi: durata di ogni fase, ritardo di
+    ogni paziente rispetto al tick di 1s e cicli saltati.
+
+    Da disattivata (default) stage() restituisce un context manager vuoto
+    condiviso e gli altri metodi ritornano subito, senza lock ne' timer.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.stages: dict[str, Histogram] = {}
+        self.lags: dict[str, Histogram] = {}
+        self.skips: dict[tuple[str, str], int] = {}
+
+    def stage(self, stage: str):
+        """with metrics.stage("read"): ..."""
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def lag(self, patient_id: str, seconds: float):
+        """Ritardo del tick del paziente rispetto alla cadenza attesa"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.lags.get(patient_id)
+            if histogram is None:
+                histogram = self.lags[patient_id] = Histogram()
+            histogram.observe(max(seconds, 0.0))
+
+    def skip(self, patient_id: str, reason: str):
+        """Ciclo del paziente terminato senza pubblicare"""
+        if not self.enabled:
+            return
+        key = (patient_id, reason)
+        with self.lock:
+            self.skips[key] = self.skips.get(key, 0) + 1
+
+    def drain(self):
+        """Restituisce e azzera i dati raccolti dall'ultima chiamata"""
+        with self.lock:
+            snapshot = (self.stages, self.lags, self.skips)
+            self.stages, self.lags, self.skips = {}, {}, {}
+        return snapshot
+
+    def lines(self, tags: dict | None = None, ts_ns: int | None = None) -> list[str]:
+        """Svuota le metriche e le converte in line protocol di Influx"""
+        stages, lags, skips = self.drain()
+        ts_ns = ts_ns if ts_ns is not None else time.time_ns()
+        common = "".join(f",{k}={escape_tag(v)}" for k, v in sorted((tags or {}).items()))
+
+        lines = []
+        for stage, histogram in stages.items():
+            lines.append(f"analyzer_stage{common},stage={escape_tag(stage)} {histogram_fields(histogram)} {ts_ns}")
+        for patient_id, histogram in lags.items():
+            lines.append(f"analyzer_lag{common},patient_id={escape_tag(patient_id)} {histogram_fields(histogram)} {ts_ns}")
+        for (patient_id, reason), count in skips.items():
+            lines.append(
+                f"analyzer_skips{common},patient_id={escape_tag(patient_id)},reason={escape_tag(reason)} count={count}i {ts_ns}"
+            )
+        return lines
+
+
+def histogram_fields(histogram: Histogram) -> str:
+    return (
+        f"count={histogram.count}i,sum={histogram.sum},max={histogram.max},"
+        f"p50={histogram.quantile(0.5)},p99={histogram.quantile(0.99)}"
+    )
+
+
+def escape_tag(value) -> str:
+    return str(value).replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+# Istanza condivisa dai moduli dell'analyzer, attivata da MetricsWriter
+metrics = LoopMetrics()
+
+
+class MetricsWriter:
+    """Scrive periodicamente le metriche di LoopMetrics in Influx (measurement analyzer_*)"""
+
+    def __init__(self, write, interval: float = 10, tags: dict | None = None, loop_metrics: LoopMetrics = metrics):
+        self.write = write
+        self.interval = interval
+        self.tags = tags or {}
+        self.metrics = loop_metrics
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.metrics.enabled = True
+        self.thread = threading.Thread(target=self.run, name="metrics_writer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Ferma il thread e scrive l'ultimo intervallo"""
+        self.metrics.enabled = False
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval)
+        self.flush()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        lines = self.metrics.lines(self.tags)
+        if not lines:
+            return
+        try:
+            self.write(lines)
+        except Exception as e:
+            print(f"[METRICS] Error writing {len(lines)} points: {e}")
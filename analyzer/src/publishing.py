@@ -0,0 +1,51 @@
+import json
+import threading
+
+
+class SymptomFilter:
+    """
+    Decide quali messaggi di sintomi pubblicare e li numera.
+
+    In modalita' "always" ogni messaggio viene pubblicato; in modalita'
+    "changes" solo quando cambia una classificazione (status, trend,
+    intensity o versione delle regole) oppure, per segnalare che il paziente
+    e' ancora monitorato, quando dall'ultimo messaggio pubblicato sono
+    passati keyframe_seconds.
+
+    Ogni messaggio pubblicato riceve un numero di sequenza per paziente
+    (seq, da 1 a ogni avvio dell'analyzer): un salto indica messaggi persi.
+    keyframe e' True per i messaggi pubblicati senza cambiamenti.
+    """
+
+    def __init__(self, mode: str = "always", keyframe_seconds: float = 30):
+        self.mode = mode
+        self.keyframe_seconds = keyframe_seconds
+        self.state: dict[str, tuple[str, float, int]] = {}  # patient_id -> (chiave, timestamp in s, seq)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(message: dict) -> str:
+        return json.dumps(
+            [message['status'], message['trend'], message['intensity'], message.get('rules_version')],
+            sort_keys=True
+        )
+
+    def filter(self, patient_id: str, message: dict) -> dict | None:
+        """Il messaggio con seq e keyframe, o None se non va pubblicato"""
+        key = self.key(message)
+        now = message['timestamp'] / 1000
+
+        with self.lock:
+            previous = self.state.get(patient_id)
+            changed = previous is None or previous[0] != key
+
+            if self.mode == "changes" and not changed and now - previous[1] < self.keyframe_seconds:
+                return None
+
+            seq = 1 if previous is None else previous[2] + 1
+            self.state[patient_id] = (key, now, seq)
+
+        message['seq'] = seq
+        message['keyframe'] = not changed
+        return message
+
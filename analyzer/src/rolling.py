@@ -0,0 +1,241 @@
+from bisect import bisect_left, insort
+from collections import deque
+import math
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Buffer circolare preallocato degli ultimi N valori: push O(1), nessuna
+    riallocazione, il valore piu' vecchio viene sovrascritto a buffer pieno.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.ring = np.empty(window)
+        self.pos = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, value: float):
+        """Inserisce value e restituisce il valore sovrascritto (None se il buffer non era pieno)"""
+        value = float(value)
+        evicted = None
+        if self.count == self.window:
+            evicted = float(self.ring[self.pos])
+        else:
+            self.count += 1
+
+        self.ring[self.pos] = value
+        self.pos = (self.pos + 1) % self.window
+        return evicted
+
+    def extend(self, values):
+        for value in values:
+            self.push(value)
+
+    def values(self) -> np.ndarray:
+        """Valori nel buffer, dal piu' vecchio al piu' recente"""
+        if self.count < self.window:
+            return self.ring[:self.count].copy()
+        return np.concatenate((self.ring[self.pos:], self.ring[:self.pos]))
+
+
+class RollingQuantile(RingBuffer):
+    """
+    Quantile su una finestra scorrevole degli ultimi N valori.
+
+    Oltre al ring buffer, i valori sono tenuti in una piccola lista ordinata:
+    push ed eviction costano una bisect e uno spostamento di memoria, la
+    lettura del quantile e' O(1).
+    Il risultato coincide con np.percentile(valori, q) (interpolazione lineare);
+    come np.percentile, restituisce NaN se la finestra contiene NaN.
+    """
+
+    def __init__(self, window: int, q: float):
+        super().__init__(window)
+        self.q = q / 100
+        self.sorted = []
+        self.nan_count = 0
+
+    def push(self, value: float):
+        value = float(value)
+        evicted = super().push(value)
+
+        # Eviction del valore piu' vecchio
+        if evicted is not None:
+            if math.isnan(evicted):
+                self.nan_count -= 1
+            else:
+                del self.sorted[bisect_left(self.sorted, evicted)]
+
+        if math.isnan(value):
+            self.nan_count += 1
+        else:
+            insort(self.sorted, value)
+        return evicted
+
+    def value(self) -> float:
+        if self.count == 0:
+            raise ValueError("RollingQuantile vuoto")
+        if self.nan_count:
+            return math.nan
+
+        # Stessa interpolazione lineare di np.percentile
+        index = (self.count - 1) * self.q
+        lo = math.floor(index)
+        hi = min(lo + 1, self.count - 1)
+        gamma = index - lo
+        a = self.sorted[lo]
+        b = self.sorted[hi]
+        diff = b - a
+        if gamma >= 0.5:
+            return b - diff * (1 - gamma)
+        return a + diff * gamma
+
+
+class EWMVariance:
+    """
+    Varianza EWM online, un passo per campione, equivalente a
+    pd.Series.ewm(span=span).var() (adjust=True, bias=False) per ogni colonna.
+    """
+
+    def __init__(self, spans):
+        alpha = 2 / (np.asarray(spans, dtype=float) + 1)
+        self.old_wt_factor = 1 - alpha
+        self.mean = None
+        self.cov = None
+        self.sum_wt = None
+        self.sum_wt2 = None
+        self.old_wt = None
+
+    def push(self, x) -> np.ndarray:
+        x = np.asarray(x, dtype=float)
+        observed = ~np.isnan(x)
+
+        if self.mean is None:
+            self.mean = x.copy()
+            self.cov = np.zeros_like(x)
+            self.sum_wt = np.ones_like(x)
+            self.sum_wt2 = np.ones_like(x)
+            self.old_wt = np.ones_like(x)
+        else:
+            # Le metriche senza media (solo NaN finora) partono dal primo valore osservato
+            started = ~np.isnan(self.mean)
+            self.mean = np.where(started, self.mean, x)
+            step = started
+
+            f = self.old_wt_factor
+            self.sum_wt = np.where(step, self.sum_wt * f, self.sum_wt)
+            self.sum_wt2 = np.where(step, self.sum_wt2 * (f * f), self.sum_wt2)
+            self.old_wt = np.where(step, self.old_wt * f, self.old_wt)
+
+            update = step & observed
+            old_mean = self.mean
+            with np.errstate(invalid='ignore'):
+                mean = np.where(old_mean != x, (self.old_wt * old_mean + x) / (self.old_wt + 1), old_mean)
+                cov = (self.old_wt * (self.cov + (old_mean - mean) * (old_mean - mean)) + (x - mean) * (x - mean)) / (self.old_wt + 1)
+            self.mean = np.where(update, mean, old_mean)
+            self.cov = np.where(update, cov, self.cov)
+            self.sum_wt = np.where(update, self.sum_wt + 1, self.sum_wt)
+            self.sum_wt2 = np.where(update, self.sum_wt2 + 1, self.sum_wt2)
+            self.old_wt = np.where(update, self.old_wt + 1, self.old_wt)
+
+        numerator = self.sum_wt * self.sum_wt
+        denominator = numerator - self.sum_wt2
+        factor = np.full_like(x, np.nan)
+        np.divide(numerator, denominator, out=factor, where=denominator > 0)
+        return factor * self.cov
+
+
+class RollingAggregator:
+    """
+    Media, minimo, massimo e conteggio per metrica su una finestra temporale
+    scorrevole (campioni con t >= ultimo t ricevuto - window).
+
+    Ogni campione entra ed esce una sola volta: somme e conteggi sono
+    aggiornati in O(1), minimo e massimo con deque monotone.
+    I tempi sono numeri crescenti per metrica (es. nanosecondi) nella stessa
+    unita' di window; campioni NaN o non piu' recenti dell'ultimo sono ignorati.
+    """
+
+    # ogni quante eviction la somma viene ricalcolata, per non accumulare errori di arrotondamento
+    RESYNC_EVICTIONS = 1024
+
+    def __init__(self, window, metrics):
+        self.window = window
+        self.metrics = list(metrics)
+        self.end = None
+        self.samples = {m: deque() for m in self.metrics}  # (t, valore)
+        self.sums = dict.fromkeys(self.metrics, 0.0)
+        self.mins = {m: deque() for m in self.metrics}  # valori crescenti
+        self.maxs = {m: deque() for m in self.metrics}  # valori decrescenti
+        self.last_t = dict.fromkeys(self.metrics)
+        self.evictions = dict.fromkeys(self.metrics, 0)
+
+    def push(self, metric, t, value) -> bool:
+        """Aggiunge un campione; False se e' stato ignorato"""
+        value = float(value)
+        last_t = self.last_t[metric]
+        if math.isnan(value) or (last_t is not None and t <= last_t):
+            return False
+        self.last_t[metric] = t
+
+        self.samples[metric].append((t, value))
+        self.sums[metric] += value
+
+        mins = self.mins[metric]
+        while mins and mins[-1][1] >= value:
+            mins.pop()
+        mins.append((t, value))
+
+        maxs = self.maxs[metric]
+        while maxs and maxs[-1][1] <= value:
+            maxs.pop()
+        maxs.append((t, value))
+
+        if self.end is None or t > self.end:
+            self.end = t
+            self.expire()
+        else:
+            # campione di una metrica in ritardo rispetto alle altre
+            self.expire([metric])
+        return True
+
+    def expire(self, metrics=None):
+        """Elimina i campioni usciti dalla finestra"""
+        start = self.end - self.window
+        for m in self.metrics if metrics is None else metrics:
+            samples = self.samples[m]
+            while samples and samples[0][0] < start:
+                _, value = samples.popleft()
+                self.sums[m] -= value
+                self.evictions[m] += 1
+
+            if not samples:
+                self.sums[m] = 0.0
+            elif self.evictions[m] >= self.RESYNC_EVICTIONS:
+                self.sums[m] = math.fsum(value for _, value in samples)
+                self.evictions[m] = 0
+
+            for monotonic in (self.mins[m], self.maxs[m]):
+                while monotonic and monotonic[0][0] < start:
+                    monotonic.popleft()
+
+    def count(self, metric) -> int:
+        return len(self.samples[metric])
+
+    def mean(self, metric) -> float:
+        n = len(self.samples[metric])
+        return self.sums[metric] / n if n else math.nan
+
+    def min(self, metric) -> float:
+        mins = self.mins[metric]
+        return mins[0][1] if mins else math.nan
+
+    def max(self, metric) -> float:
+        maxs = self.maxs[metric]
+        return maxs[0][1] if maxs else math.nan
@@ -0,0 +1,98 @@
+import heapq
+import threading
+import time
+
+# Stati che richiedono la cadenza piu' stretta
+CRITICAL_STATES = {
+    "GRAVE_HYPOXIA",
+    "FAILURE_OXYGEN_THERAPY",
+    "RESPIRATORY_DISTRESS",
+    "SHOCK",
+    "DISTRESS_OVERLOAD",
+    "CIRCULARITY_UNSTABILITY",
+}
+
+# Stati di un paziente stabile
+STABLE_STATES = {
+    "STABLE_RESPIRATION",
+    "STABLE_SATURATION",
+    "STABLE_RESPIRATION_EFFORT",
+    "STABLE_HR",
+    "NORMAL_PERFUSION",
+}
+
+STRONG_SLOPES = {"STRONG_DECREASE", "STRONG_INCREASE"}
+
+
+def acuity(message: dict | None) -> str:
+    """
+    Livello di acuzie dall'ultimo messaggio dei sintomi:
+    "critical" (stato critico, trend DETERIORING o variazione STRONG_*),
+    "watch" (qualsiasi altro scostamento dalla stabilita') o "stable".
+    Senza messaggio (dati o baseline mancanti) il paziente e' "critical",
+    cosi' viene ricontrollato ad ogni tick come negli altri runtime.
+    """
+    if message is None:
+        return "critical"
+
+    states = set(message["status"].values())
+    trends = set(message["trend"].values())
+    slopes = set(message["intensity"].values())
+
+    if states & CRITICAL_STATES or "DETERIORING" in trends or slopes & STRONG_SLOPES:
+        return "critical"
+    if states - STABLE_STATES or trends - {"STABLE"} or slopes - {"STABLE"}:
+        return "watch"
+    return "stable"
+
+
+class AnalysisScheduler:
+    """
+    Scadenze di analisi dei pazienti in un heap condiviso da un pool di worker.
+
+    Ogni paziente e' nell'heap al piu' una volta: take() lo toglie quando la
+    sua scadenza e' arrivata e done() lo rimette con la scadenza successiva,
+    quindi un paziente non viene mai analizzato da due worker insieme.
+    L'intervallo e' limitato a max_interval secondi.
+    """
+
+    def __init__(self, patient_ids, intervals: dict[str, float], max_interval: float, clock=time.monotonic):
+        self.intervals = intervals
+        self.max_interval = max_interval
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.stopped = False
+
+        now = clock()
+        self.heap = [(now, patient_id) for patient_id in patient_ids]
+        heapq.heapify(self.heap)
+
+    def interval(self, message: dict | None) -> float:
+        return min(self.intervals[acuity(message)], self.max_interval)
+
+    def take(self):
+        """(patient_id, scadenza) del prossimo paziente da analizzare, o None dopo stop()"""
+        with self.condition:
+            while not self.stopped:
+                if self.heap:
+                    deadline, patient_id = self.heap[0]
+                    wait = deadline - self.clock()
+                    if wait <= 0:
+                        heapq.heappop(self.heap)
+                        return patient_id, deadline
+                else:
+                    wait = None
+                self.condition.wait(wait)
+            return None
+
+    def done(self, patient_id: str, deadline: float, message: dict | None):
+        """Rimette il paziente nell'heap, un intervallo dopo la scadenza appena servita"""
+        next_deadline = max(deadline + self.interval(message), self.clock())
+        with self.condition:
+            heapq.heappush(self.heap, (next_deadline, patient_id))
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
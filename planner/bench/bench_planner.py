@@ -0,0 +1,246 @@
+"""
+Micro-benchmark del Planner, senza broker.
+
+Fa scorrere un corpus di messaggi di sintomi in PlannerManager.process_symptoms
+e misura messaggi al secondo e latenze p50/p99 della chiamata completa e di
+get_serializable_therapy, per ogni motore (PLANNER_ENGINE).
+
+Corpus:
+    synthetic   sequenze casuali in cui ogni paziente cambia stato di rado,
+                come in reparto
+    exhaustive  tutte le combinazioni di status e dei trend letti dalle regole,
+                con le intensita' a rotazione
+    recorded    file JSON Lines: l'output di replay/replay.py (symptoms/<id>.jsonl,
+                paziente dal nome del file) o un corpus salvato con --save-corpus
+
+Le terapie prodotte possono essere salvate come golden (--save-golden) e
+confrontate in seguito (--golden): termina con codice 1 se una terapia cambia.
+I file con estensione .gz sono compressi. Il golden del corpus exhaustive
+(deterministico) e' planner/bench/golden_exhaustive.jsonl.gz.
+
+    python planner/bench/bench_planner.py
+    python planner/bench/bench_planner.py --corpus exhaustive --golden planner/bench/golden_exhaustive.jsonl.gz
+    python planner/bench/bench_planner.py --corpus recorded --recorded replay_out/symptoms --golden golden.jsonl
+"""
+import argparse
+import gzip
+import itertools
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import planner_manager
+from planner_manager import PlannerManager
+import decision_table
+from decision_table import STATUS_VALUES, TREND_VALUES, INTENSITY_VALUES
+
+METRICS = ["hr", "rr", "spo2", "sbp", "dbp", "map"]
+ENGINES = ["table", "rules"]
+
+# istante iniziale dei corpus generati (ms)
+START_MS = 1_700_000_000_000
+
+
+def random_symptoms(rng: random.Random) -> dict:
+    return {
+        "status": {key: rng.choice(values) for key, values in STATUS_VALUES.items()},
+        "trend": {metric: rng.choice(TREND_VALUES) for metric in METRICS},
+        "intensity": {metric: rng.choice(INTENSITY_VALUES) for metric in METRICS},
+    }
+
+
+def synthetic_corpus(patients: int, messages: int, change_probability: float, seed: int) -> list[tuple[str, dict]]:
+    """Un messaggio al secondo per paziente; ogni messaggio cambia lo stato con change_probability"""
+    rng = random.Random(seed)
+    current = {str(p): random_symptoms(rng) for p in range(1, patients + 1)}
+    corpus = []
+    for i in range(messages):
+        patient_id = str(i % patients + 1)
+        if rng.random() < change_probability:
+            current[patient_id] = random_symptoms(rng)
+        message = json.loads(json.dumps(current[patient_id]))
+        message["timestamp"] = START_MS + (i // patients) * 1000
+        corpus.append((patient_id, message))
+    return corpus
+
+
+def exhaustive_corpus(patients: int) -> list[tuple[str, dict]]:
+    """Tutte le combinazioni di status e dei trend di spo2, rr, hr e map"""
+    statuses = list(itertools.product(*STATUS_VALUES.values()))
+    trends = list(itertools.product(TREND_VALUES, repeat=4))
+    corpus = []
+    for i, (status, trend) in enumerate(itertools.product(statuses, trends)):
+        patient_id = str(i % patients + 1)
+        message = {
+            "status": dict(zip(STATUS_VALUES, status)),
+            "trend": {metric: "STABLE" for metric in METRICS} | dict(zip(["spo2", "rr", "hr", "map"], trend)),
+            "intensity": {
+                metric: INTENSITY_VALUES[(i + offset) % len(INTENSITY_VALUES)]
+                for offset, metric in enumerate(METRICS)
+            },
+            "timestamp": START_MS + (i // patients) * 1000,
+        }
+        corpus.append((patient_id, message))
+    return corpus
+
+
+def recorded_corpus(path: Path) -> list[tuple[str, dict]]:
+    """
+    Righe {"patient_id": ..., "symptoms": {...}} (--save-corpus) oppure messaggi
+    dei sintomi, con il paziente dal nome del file (replay/replay.py).
+    Con piu' file i messaggi sono ordinati per timestamp.
+    """
+    files = sorted(path.rglob("*.jsonl")) if path.is_dir() else [path]
+    corpus = []
+    for file in files:
+        for line in file.read_text().splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "symptoms" in record:
+                corpus.append((str(record["patient_id"]), record["symptoms"]))
+            else:
+                corpus.append((file.stem, record))
+
+    if len(files) > 1:
+        corpus.sort(key=lambda item: item[1].get("timestamp", 0))
+    return corpus
+
+
+def load_corpus(args) -> list[tuple[str, dict]]:
+    if args.corpus == "synthetic":
+        return synthetic_corpus(args.patients, args.messages, args.change_probability, args.seed)
+    if args.corpus == "exhaustive":
+        return exhaustive_corpus(args.patients)
+    if args.recorded is None:
+        sys.exit("--corpus recorded needs --recorded PATH")
+    return recorded_corpus(args.recorded)
+
+
+def run_corpus(corpus: list[tuple[str, dict]], engine: str, record: bool = False) -> dict:
+    """Un passaggio del corpus su planner nuovi; il tempo dei planner e' il timestamp del messaggio"""
+    planner_manager.PLANNER_ENGINE = engine
+    PlannerManager._planners.clear()
+    PlannerManager._last_used.clear()
+
+    now = [0.0]
+    process = np.empty(len(corpus))
+    serialize = np.empty(len(corpus))
+    therapies = []
+
+    for i, (patient_id, message) in enumerate(corpus):
+        planner = PlannerManager.get_planner(patient_id)
+        planner.clock = lambda: now[0]
+        now[0] = message["timestamp"] / 1000 if "timestamp" in message else now[0] + 1
+
+        start = time.perf_counter()
+        therapy = PlannerManager.process_symptoms(patient_id, message)
+        process[i] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        planner.get_serializable_therapy()
+        serialize[i] = time.perf_counter() - start
+
+        if record:
+            therapy["alert"] = sorted(therapy["alert"])
+            therapies.append({"patient_id": patient_id, "therapy": therapy})
+
+    return {"process": process, "serialize": serialize, "therapies": therapies}
+
+
+def golden_diff(expected: list[dict], actual: list[dict], limit: int = 10) -> int:
+    """Stampa le prime terapie diverse dal golden; restituisce quante sono"""
+    if len(expected) != len(actual):
+        print(f"Golden has {len(expected)} therapies, corpus produced {len(actual)}")
+    differences = 0
+    for i, (want, got) in enumerate(zip(expected, actual)):
+        if want == got:
+            continue
+        differences += 1
+        if differences <= limit:
+            print(f"  message {i} (patient {got['patient_id']}):")
+            print(f"    golden: {want['therapy']}")
+            print(f"    actual: {got['therapy']}")
+    return differences + abs(len(expected) - len(actual))
+
+
+def write_jsonl(path: Path, records):
+    data = "".join(json.dumps(record) + "\n" for record in records).encode()
+    # mtime fisso: lo stesso golden da' lo stesso file compresso
+    path.write_bytes(gzip.compress(data, mtime=0) if path.suffix == ".gz" else data)
+
+
+def read_jsonl(path: Path) -> list[dict]:
+    data = path.read_bytes()
+    text = (gzip.decompress(data) if path.suffix == ".gz" else data).decode()
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planner micro-benchmark")
+    parser.add_argument("--corpus", choices=["synthetic", "exhaustive", "recorded"], default="synthetic")
+    parser.add_argument("--recorded", type=Path, help="JSONL file or directory (e.g. replay_out/symptoms)")
+    parser.add_argument("--patients", type=int, default=50, help="patients of the generated corpora")
+    parser.add_argument("--messages", type=int, default=50000, help="messages of the synthetic corpus")
+    parser.add_argument("--change-probability", type=float, default=0.05, help="synthetic: chance a message changes state")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma separated PLANNER_ENGINE values")
+    parser.add_argument("--repeats", type=int, default=3, help="timed passes over the corpus per engine")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-corpus", type=Path, help="write the corpus as JSONL, replayable with --corpus recorded")
+    parser.add_argument("--save-golden", type=Path, help="write the therapies of the first engine as JSONL (.gz compressed)")
+    parser.add_argument("--golden", type=Path, help="golden therapies to compare every engine against")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args)
+    print(f"{args.corpus} corpus: {len(corpus)} messages, {len({p for p, _ in corpus})} patients")
+
+    if args.save_corpus is not None:
+        write_jsonl(args.save_corpus, ({"patient_id": p, "symptoms": m} for p, m in corpus))
+        print(f"Saved corpus to {args.save_corpus}")
+
+    golden = None
+    if args.golden is not None:
+        golden = read_jsonl(args.golden)
+
+    print(f"\n{'engine':<8}{'msg/s':>12}{'p50 us':>10}{'p99 us':>10}{'serialize p50':>15}{'p99 us':>10}")
+    failed = False
+    for engine in [e for e in args.engines.split(",") if e]:
+        # primo passaggio non misurato: tabella calda, terapie per il golden
+        therapies = run_corpus(corpus, engine, record=True)["therapies"]
+
+        process, serialize = [], []
+        for _ in range(args.repeats):
+            result = run_corpus(corpus, engine)
+            process.append(result["process"])
+            serialize.append(result["serialize"])
+        process, serialize = np.concatenate(process), np.concatenate(serialize)
+
+        print(
+            f"{engine:<8}{len(process) / process.sum():>12.0f}"
+            f"{np.percentile(process, 50) * 1e6:>10.2f}{np.percentile(process, 99) * 1e6:>10.2f}"
+            f"{np.percentile(serialize, 50) * 1e6:>15.2f}{np.percentile(serialize, 99) * 1e6:>10.2f}"
+        )
+
+        if args.save_golden is not None and golden is None:
+            write_jsonl(args.save_golden, therapies)
+            golden = therapies
+            print(f"Saved golden therapies of engine {engine} to {args.save_golden}")
+        elif golden is not None:
+            differences = golden_diff(golden, therapies)
+            if differences:
+                print(f"{engine}: {differences} therapies differ from the golden")
+                failed = True
+
+    print(f"\ntable entries: {sum(len(table) for table in decision_table.TABLES.values())}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Verifica che la tabella di decisione (planner/src/decision_table.py) dia le
+stesse terapie dei metodi di Planner.
+
+1. Per ogni regola enumera tutte le combinazioni dei valori dei campi che
+   legge (non solo i rappresentanti delle classi), su una griglia di stati
+   della terapia che tocca ogni bucket e di calculate_dt, e confronta un passo
+   completo (tutte le regole); gli altri campi del messaggio sono casuali, per
+   accorgersi di campi letti ma non in RULE_FIELDS.
+2. Fa scorrere sequenze casuali di messaggi su due planner, uno per motore,
+   e confronta le terapie serializzate.
+3. Calcola tutte le tabelle (compile_tables) e ne riporta la dimensione.
+
+    python planner/bench/check_decision_table.py
+    python planner/bench/check_decision_table.py --states 16 --sequences 200
+
+Termina con codice 1 alla prima differenza.
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from planner import Planner
+import decision_table
+from decision_table import RULES, RULE_FIELDS, STATUS_VALUES, TREND_VALUES, INTENSITY_VALUES
+
+METRICS = ["hr", "rr", "spo2", "sbp", "dbp", "map"]
+
+# griglia degli stati della terapia: (ox, fluids, carvedilolo, improve, carvedilolo sospeso, improve sospeso)
+# con i valori ai bordi dei bucket di decision_table
+STATE_GRID = list(itertools.product(
+    [0, 1, 5, 6, 7],
+    [None, "BOLUS"],
+    [0, 0.0, 0.5, 1.0, 1.25, 2.5],
+    [0, 0.0, 0.1, 0.25, 0.5],
+    [(0, 0), (1.25, 0), (1.25, 0.25), (1.0, 0.5)],
+))
+
+NOW = 1_000_000
+
+
+def random_message(rng: random.Random) -> dict:
+    return {
+        "status": {key: rng.choice(values) for key, values in STATUS_VALUES.items()},
+        "trend": {metric: rng.choice(TREND_VALUES) for metric in METRICS},
+        "intensity": {metric: rng.choice(INTENSITY_VALUES) for metric in METRICS},
+    }
+
+
+def new_planner(grid_state, last_bb_incr, now) -> Planner:
+    ox, fluids, carvedilolo, improve, (stopped_carvedilolo, stopped_improve) = grid_state
+    planner = Planner()
+    planner.clock = lambda: now
+    decision_table.set_therapy_state(planner, (ox, fluids, carvedilolo, improve, stopped_carvedilolo, stopped_improve))
+    planner.last_bb_incr = last_bb_incr
+    return planner
+
+
+def snapshot(planner: Planner) -> tuple:
+    """Stato completo del planner, con i tipi (0 e 0.0 vengono serializzati diversamente)"""
+    values = decision_table.therapy_state(planner) + (planner.last_bb_incr,)
+    return tuple((type(v).__name__, v) for v in values) + (tuple(sorted(planner.therapy["alert"])),)
+
+
+def check_rule(rule: str, states_per_combination: int, rng: random.Random) -> int:
+    fields = RULE_FIELDS[rule]
+    domains = [decision_table.field_values(section, key) for section, key, _ in fields]
+    # ultimo incremento del beta-bloccante: mai, appena fatto, oltre dt_incr
+    last_values = [None, NOW - 2, NOW - 10]
+
+    # le regole piccole sono provate su tutta la griglia
+    combinations = 1
+    for domain in domains:
+        combinations *= len(domain)
+    if combinations * len(STATE_GRID) <= 50_000:
+        states_per_combination = len(STATE_GRID)
+
+    checked = 0
+    offset = 0
+    for combination in itertools.product(*domains):
+        message = random_message(rng)
+        for (section, key, _), value in zip(fields, combination):
+            message[section][key] = value
+
+        for i in range(states_per_combination):
+            grid_state = STATE_GRID[(offset + i) % len(STATE_GRID)]
+            for last_bb_incr in last_values:
+                reference = new_planner(grid_state, last_bb_incr, NOW)
+                table = new_planner(grid_state, last_bb_incr, NOW)
+                for reference_rule in RULES:
+                    getattr(reference, reference_rule)(message)
+                decision_table.run(table, message)
+
+                if snapshot(reference) != snapshot(table):
+                    print(f"{rule}: mismatch for {message} from state {grid_state}, last_bb_incr {last_bb_incr}")
+                    print(f"  rules: {snapshot(reference)}")
+                    print(f"  table: {snapshot(table)}")
+                    sys.exit(1)
+                checked += 1
+        offset += states_per_combination
+    return checked
+
+
+def check_sequences(sequences: int, length: int, rng: random.Random) -> int:
+    checked = 0
+    for _ in range(sequences):
+        now = [NOW]
+        reference, table = Planner(), Planner()
+        reference.clock = table.clock = lambda: now[0]
+
+        # pochi stati per sequenza, cosi' gli stessi sintomi si ripetono come in reparto
+        messages = [random_message(rng) for _ in range(4)]
+        for step in range(length):
+            message = rng.choice(messages)
+            now[0] += rng.choice([1, 1, 1, 3, 7])
+
+            for rule in RULES:
+                getattr(reference, rule)(message)
+            decision_table.run(table, message)
+
+            expected = reference.get_serializable_therapy()
+            actual = table.get_serializable_therapy()
+            expected["alert"].sort()
+            actual["alert"].sort()
+            if repr(expected) != repr(actual) or reference.last_bb_incr != table.last_bb_incr:
+                print(f"sequence mismatch at step {step} for {message}")
+                print(f"  rules: {expected}")
+                print(f"  table: {actual}")
+                sys.exit(1)
+            checked += 1
+    return checked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the planner decision table against the rule methods")
+    parser.add_argument("--states", type=int, default=2, help="therapy states tried for every field combination")
+    parser.add_argument("--sequences", type=int, default=100, help="random message sequences")
+    parser.add_argument("--length", type=int, default=200, help="messages per sequence")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for rule in RULES:
+        started = time.perf_counter()
+        checked = check_rule(rule, args.states, rng)
+        print(f"{rule}: {checked} cases match ({time.perf_counter() - started:.1f}s)")
+
+    started = time.perf_counter()
+    checked = check_sequences(args.sequences, args.length, rng)
+    print(f"sequences: {checked} messages match ({time.perf_counter() - started:.1f}s)")
+    print(f"table entries used: {sum(len(table) for table in decision_table.TABLES.values())}")
+
+    started = time.perf_counter()
+    entries = decision_table.compile_tables()
+    print(f"compiled tables: {entries} entries ({time.perf_counter() - started:.1f}s)")
+    for rule in RULES:
+        print(f"  {rule}: {decision_table.TABLE_SIZE[rule]}")
+
+
+if __name__ == "__main__":
+    main()
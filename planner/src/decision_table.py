@@ -0,0 +1,375 @@
+"""
+Tabella di decisione del Planner.
+
+Le regole cliniche restano quelle dei metodi di Planner (handle_beta_blocking,
+stop_fluids, fluids_escalation, ox_therapy, pharmacy_therapy), che fanno da
+riferimento. Ogni regola ha una tabella finita, con chiave:
+- la classe di ogni campo del messaggio che legge: i valori che la regola non
+  distingue (es. tutte le pressioni diverse da SHOCK per handle_beta_blocking)
+  sono una sola classe;
+- il bucket di ogni valore della terapia che confronta, delimitato dalle
+  soglie dei confronti delle regole (0, dose iniziale e incremento del
+  beta-bloccante, ossigeno massimo non invasivo);
+- per pharmacy_therapy, l'esito di calculate_dt.
+Il valore e' l'azione: ogni valore della terapia scritto dalla regola deriva
+da un valore di partenza piu' uno spostamento, o e' una costante; in piu' gli
+alert aggiunti e se l'ultimo incremento del beta-bloccante va spostato ad ora.
+
+Le azioni sono calcolate eseguendo la regola su un Planner di prova, con un
+valore rappresentativo per bucket: al primo uso, oppure tutte con compile_tables().
+I messaggi con valori fuori enumerazione (o campi mancanti) e le terapie con
+valori non numerici passano per il metodo di riferimento.
+"""
+import itertools
+import math
+
+from planner import Planner
+
+STATUS_VALUES = {
+    "oxigenation": ("STABLE_RESPIRATION", "LIGHT_HYPOXIA", "GRAVE_HYPOXIA", "FAILURE_OXYGEN_THERAPY", "STABLE_SATURATION"),
+    "respiration": ("STABLE_RESPIRATION_EFFORT", "MODERATE_TACHYPNEA", "RESPIRATORY_DISTRESS", "BRADYPNEA"),
+    "heart_rate": ("STABLE_HR", "PRIMARY_TACHYCARDIA", "COMPENSED_TACHYCARDIA", "HIGH_HR"),
+    "blood_pressure": ("NORMAL_PERFUSION", "MODERATE_HYPOTENSION", "SHOCK", "DISTRESS_OVERLOAD", "CIRCULARITY_UNSTABILITY"),
+}
+TREND_VALUES = ("STABLE", "IMPROVING", "DETERIORING")
+INTENSITY_VALUES = ("STRONG_DECREASE", "MODERATE_DECREASE", "STABLE", "MODERATE_INCREASE", "STRONG_INCREASE")
+
+DECREASE = ("STRONG_DECREASE", "MODERATE_DECREASE")
+INCREASE = ("MODERATE_INCREASE", "STRONG_INCREASE")
+
+# Campi del messaggio letti da ogni regola, come (sezione, chiave, classi):
+# classi e' la lista dei gruppi di valori distinti dalla regola (gli altri valori
+# formano una classe sola), None se la regola distingue ogni valore
+RULE_FIELDS = {
+    "handle_beta_blocking": (
+        ("status", "blood_pressure", [("SHOCK",)]),
+        ("status", "oxigenation", [("GRAVE_HYPOXIA",)]),
+        ("status", "respiration", [("BRADYPNEA",)]),
+    ),
+    "stop_fluids": (
+        ("status", "respiration", [("RESPIRATORY_DISTRESS",)]),
+        ("status", "oxigenation", [("FAILURE_OXYGEN_THERAPY",)]),
+        ("status", "blood_pressure", [("DISTRESS_OVERLOAD",)]),
+    ),
+    "fluids_escalation": (
+        ("status", "blood_pressure", [("CIRCULARITY_UNSTABILITY",), ("MODERATE_HYPOTENSION",), ("SHOCK",)]),
+        ("trend", "map", None),
+    ),
+    "ox_therapy": (
+        # gli altri valori sono gli stati STABLE_*
+        ("status", "oxigenation", [("LIGHT_HYPOXIA",), ("GRAVE_HYPOXIA",), ("FAILURE_OXYGEN_THERAPY",)]),
+        ("status", "respiration", None),
+        ("status", "heart_rate", [("COMPENSED_TACHYCARDIA",)]),
+        ("trend", "spo2", None),
+        ("trend", "rr", None),
+        ("trend", "hr", None),
+        ("intensity", "spo2", [DECREASE]),
+        ("intensity", "rr", [DECREASE]),
+        ("intensity", "hr", [("STRONG_DECREASE",)]),
+    ),
+    "pharmacy_therapy": (
+        ("status", "heart_rate", [("STABLE_HR",), ("PRIMARY_TACHYCARDIA",)]),
+        ("status", "blood_pressure", None),
+        ("trend", "hr", None),
+        ("trend", "map", None),
+        ("trend", "spo2", [("DETERIORING",)]),
+        ("intensity", "hr", [("STRONG_INCREASE",)]),
+        ("intensity", "map", [INCREASE]),
+    ),
+}
+
+# Ordine di PlannerManager.process_symptoms
+RULES = ("handle_beta_blocking", "stop_fluids", "fluids_escalation", "ox_therapy", "pharmacy_therapy")
+
+# Valori della terapia, nell'ordine di therapy_state
+SLOTS = ("ox_therapy", "fluids", "carvedilolo_beta_blocking", "improve_beta_blocking",
+         "stopped_carvedilolo_beta_blocking", "stopped_improve_beta_blocking")
+OX, FLUIDS, CARVEDILOLO, IMPROVE, STOPPED_CARVEDILOLO, STOPPED_IMPROVE = range(len(SLOTS))
+
+# Valori della terapia confrontati da ogni regola (quelli solo copiati o
+# assegnati non fanno parte della chiave)
+RULE_SLOTS = {
+    "handle_beta_blocking": (CARVEDILOLO, STOPPED_CARVEDILOLO),
+    "stop_fluids": (FLUIDS,),
+    "fluids_escalation": (FLUIDS,),
+    "ox_therapy": (OX,),
+    "pharmacy_therapy": (CARVEDILOLO, IMPROVE),
+}
+
+# regole che chiamano calculate_dt
+DT_RULES = ("pharmacy_therapy",)
+
+# stato di calculate_dt(): ultimo incremento mai registrato, intervallo trascorso o no
+DT_UNSET, DT_ELAPSED, DT_WAITING = range(3)
+
+# istante fittizio del Planner di prova
+PROBE_NOW = 1_000_000
+
+
+def field_values(section: str, key: str) -> tuple:
+    if section == "status":
+        return STATUS_VALUES[key]
+    return TREND_VALUES if section == "trend" else INTENSITY_VALUES
+
+
+def field_classes(section: str, key: str, groups) -> list[tuple]:
+    """Classi di valori di un campo; la prima voce di ogni classe la rappresenta"""
+    values = field_values(section, key)
+    if groups is None:
+        return [(value,) for value in values]
+    grouped = {value for group in groups for value in group}
+    if not grouped <= set(values):
+        raise ValueError(f"{section}.{key}: unknown values {sorted(grouped - set(values))}")
+    rest = tuple(value for value in values if value not in grouped)
+    return list(groups) + ([rest] if rest else [])
+
+
+# (sezione, chiave, valore -> classe) e rappresentanti delle classi, per regola
+ENCODERS = {}
+FIELD_REPRESENTATIVES = {}
+for _rule, _fields in RULE_FIELDS.items():
+    _classes = [field_classes(section, key, groups) for section, key, groups in _fields]
+    ENCODERS[_rule] = tuple(
+        (section, key, {value: code for code, group in enumerate(classes) for value in group})
+        for (section, key, _), classes in zip(_fields, _classes)
+    )
+    FIELD_REPRESENTATIVES[_rule] = [[group[0] for group in classes] for classes in _classes]
+
+
+def threshold_buckets(points: tuple):
+    """
+    Bucket di un valore numerico rispetto alle soglie (ordinate): sotto la
+    prima, uguale alla prima, tra la prima e la seconda, ... sopra l'ultima.
+    Restituisce la funzione di bucket e un valore rappresentativo per bucket.
+    """
+    def bucket(value):
+        if type(value) not in (int, float) or math.isnan(value):
+            return None
+        for i, point in enumerate(points):
+            if value < point:
+                return 2 * i
+            if value == point:
+                return 2 * i + 1
+        return 2 * len(points)
+
+    representatives = [points[0] - 1]
+    for point, following in zip(points, points[1:] + (None,)):
+        representatives.append(point)
+        representatives.append(point + 1 if following is None else (point + following) / 2)
+    return bucket, representatives
+
+
+_limits = Planner()
+SLOT_BUCKETS = {
+    OX: threshold_buckets((0, _limits.MAX_NON_INVASIVE_OX_THERAPY)),
+    # le regole guardano solo se ci sono fluidi in corso
+    FLUIDS: (lambda value: 0 if value is None else 1, [None, "BOLUS"]),
+    CARVEDILOLO: threshold_buckets((0, _limits.STARTING_BB_DOSE)),
+    # improve viene decrementato e poi confrontato con 0 nello stesso passo
+    IMPROVE: threshold_buckets((0, _limits.INCR_BB_DOSE)),
+}
+# le dosi sospese tornano nella terapia con restart_beta_blocking
+SLOT_BUCKETS[STOPPED_CARVEDILOLO] = SLOT_BUCKETS[CARVEDILOLO]
+SLOT_BUCKETS[STOPPED_IMPROVE] = SLOT_BUCKETS[IMPROVE]
+del _limits
+
+# numero di chiavi di ogni tabella
+TABLE_SIZE = {
+    rule: math.prod(len(r) for r in FIELD_REPRESENTATIVES[rule])
+    * math.prod(len(SLOT_BUCKETS[slot][1]) for slot in RULE_SLOTS[rule])
+    * (3 if rule in DT_RULES else 1)
+    for rule in RULES
+}
+
+# chiave -> azione, per regola
+TABLES = {rule: {} for rule in RULES}
+
+
+class Tracked:
+    """
+    Valore della terapia sul Planner di prova: il valore di partenza da cui
+    deriva (slot) e lo spostamento accumulato (None se invariato).
+    I confronti usano il valore rappresentativo del bucket; un valore fuori
+    dalla chiave della regola (value None) non puo' essere confrontato.
+    """
+    __slots__ = ("slot", "value", "delta")
+
+    def __init__(self, slot: int, value, delta=None):
+        self.slot = slot
+        self.value = value
+        self.delta = delta
+
+    def check(self, other):
+        if self.value is None or isinstance(other, Tracked):
+            raise TypeError(f"{SLOTS[self.slot]}: comparison not covered by the decision table key")
+        return self.value
+
+    def shift(self, amount):
+        self.check(amount)
+        return Tracked(self.slot, self.value + amount, amount if self.delta is None else self.delta + amount)
+
+    def __add__(self, other):
+        return self.shift(other)
+
+    def __sub__(self, other):
+        return self.shift(-other)
+
+    def __eq__(self, other):
+        return self.check(other) == other
+
+    def __ne__(self, other):
+        return self.check(other) != other
+
+    def __lt__(self, other):
+        return self.check(other) < other
+
+    def __le__(self, other):
+        return self.check(other) <= other
+
+    def __gt__(self, other):
+        return self.check(other) > other
+
+    def __ge__(self, other):
+        return self.check(other) >= other
+
+    __hash__ = None
+
+
+def therapy_state(planner: Planner) -> tuple:
+    """Valori della terapia letti o modificati dalle regole (gli alert vengono solo aggiunti)"""
+    therapy = planner.therapy
+    return (
+        therapy["ox_therapy"],
+        therapy["fluids"],
+        therapy["carvedilolo_beta_blocking"],
+        therapy["improve_beta_blocking"],
+        planner.bb_stopped_therapy["carvedilolo_beta_blocking"],
+        planner.bb_stopped_therapy["improve_beta_blocking"],
+    )
+
+
+def set_therapy_state(planner: Planner, state):
+    therapy = planner.therapy
+    (
+        therapy["ox_therapy"],
+        therapy["fluids"],
+        therapy["carvedilolo_beta_blocking"],
+        therapy["improve_beta_blocking"],
+        planner.bb_stopped_therapy["carvedilolo_beta_blocking"],
+        planner.bb_stopped_therapy["improve_beta_blocking"],
+    ) = state
+
+
+def dt_state(planner: Planner) -> int:
+    """Esito di calculate_dt() senza i suoi effetti collaterali"""
+    if planner.last_bb_incr is None:
+        return DT_UNSET
+    if int(planner.clock()) - int(planner.last_bb_incr) > planner.dt_incr:
+        return DT_ELAPSED
+    return DT_WAITING
+
+
+def encode(rule: str, patient_state: dict, state, dt: int) -> tuple | None:
+    """Chiave della regola, o None se un valore manca o non e' nell'enumerazione"""
+    try:
+        key = [codes[patient_state[section][field]] for section, field, codes in ENCODERS[rule]]
+    except (KeyError, TypeError):
+        return None
+
+    for slot in RULE_SLOTS[rule]:
+        bucket = SLOT_BUCKETS[slot][0](state[slot])
+        if bucket is None:
+            return None
+        key.append(bucket)
+
+    if rule in DT_RULES:
+        key.append(dt)
+    return tuple(key)
+
+
+def decide(rule: str, key: tuple) -> tuple:
+    """
+    Azione della regola per una chiave: (scritture, alert aggiunti, True se
+    l'ultimo incremento del beta-bloccante va spostato ad ora). Ogni scrittura
+    e' (slot, slot di partenza, spostamento), oppure (slot, None, costante).
+    """
+    fields = len(ENCODERS[rule])
+    slots = RULE_SLOTS[rule]
+
+    patient_state = {"status": {}, "trend": {}, "intensity": {}}
+    for (section, field, _), representatives, code in zip(ENCODERS[rule], FIELD_REPRESENTATIVES[rule], key):
+        patient_state[section][field] = representatives[code]
+
+    state = [Tracked(slot, None) for slot in range(len(SLOTS))]
+    for slot, bucket in zip(slots, key[fields:]):
+        value = SLOT_BUCKETS[slot][1][bucket]
+        state[slot] = None if value is None else Tracked(slot, value)
+
+    probe = Planner()
+    probe.clock = lambda: PROBE_NOW
+    set_therapy_state(probe, state)
+    if rule in DT_RULES:
+        probe.last_bb_incr = {
+            DT_UNSET: None,
+            DT_ELAPSED: PROBE_NOW - probe.dt_incr - 1,
+            DT_WAITING: PROBE_NOW - 1,
+        }[key[-1]]
+    last_bb_incr = probe.last_bb_incr
+
+    getattr(probe, rule)(patient_state)
+
+    writes = []
+    for slot, value in enumerate(therapy_state(probe)):
+        if not isinstance(value, Tracked):
+            writes.append((slot, None, value))
+        elif value.slot != slot or value.delta is not None:
+            writes.append((slot, value.slot, value.delta))
+
+    return tuple(writes), tuple(sorted(probe.therapy["alert"])), probe.last_bb_incr != last_bb_incr
+
+
+def compile_tables() -> int:
+    """Calcola tutte le azioni di tutte le tabelle; restituisce il numero di voci"""
+    for rule in RULES:
+        domains = [range(len(r)) for r in FIELD_REPRESENTATIVES[rule]]
+        domains += [range(len(SLOT_BUCKETS[slot][1])) for slot in RULE_SLOTS[rule]]
+        if rule in DT_RULES:
+            domains.append(range(3))
+        table = TABLES[rule]
+        for key in itertools.product(*domains):
+            if key not in table:
+                table[key] = decide(rule, key)
+    return sum(len(table) for table in TABLES.values())
+
+
+def run(planner: Planner, patient_state: dict):
+    """Tutte le regole, nell'ordine di PlannerManager.process_symptoms, con un lookup per regola"""
+    # solo pharmacy_therapy, l'ultima regola, usa calculate_dt
+    dt = dt_state(planner)
+    state = list(therapy_state(planner))
+    for rule in RULES:
+        key = encode(rule, patient_state, state, dt)
+        if key is None:
+            set_therapy_state(planner, state)
+            getattr(planner, rule)(patient_state)
+            state = list(therapy_state(planner))
+            continue
+
+        action = TABLES[rule].get(key)
+        if action is None:
+            action = TABLES[rule][key] = decide(rule, key)
+        writes, alerts, touch_bb_incr = action
+
+        if writes:
+            previous = tuple(state)
+            for slot, source, value in writes:
+                if source is None:
+                    state[slot] = value
+                else:
+                    state[slot] = previous[source] if value is None else previous[source] + value
+        if alerts:
+            planner.therapy["alert"].update(alerts)
+        if touch_bb_incr:
+            planner.last_bb_incr = int(planner.clock())
+
+    set_therapy_state(planner, state)
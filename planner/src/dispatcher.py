@@ -0,0 +1,105 @@
+import threading
+import zlib
+from collections import OrderedDict
+
+
+class Shard:
+    """Messaggi in attesa dei pazienti di un worker: al piu' uno per paziente, il piu' recente"""
+
+    def __init__(self):
+        self.pending: OrderedDict[str, object] = OrderedDict()
+        self.condition = threading.Condition()
+        self.max_depth = 0
+        self.processed = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+
+class SymptomDispatcher:
+    """
+    Esegue handler(patient_id, message) fuori dal thread di rete di paho.
+
+    I pazienti sono divisi tra workers shard, ognuno con un solo thread,
+    quindi i messaggi di un paziente sono elaborati in ordine e mai in
+    parallelo. Un messaggio che arriva mentre il precedente dello stesso
+    paziente e' ancora in coda lo sostituisce (conta solo il piu' recente)
+    e il paziente mantiene il suo posto in coda. Ogni shard tiene al piu'
+    queue_size pazienti in attesa: oltre, submit() scarta il messaggio.
+    """
+
+    def __init__(self, handler, workers: int = 4, queue_size: int = 1000):
+        self.handler = handler
+        self.queue_size = queue_size
+        self.shards = [Shard() for _ in range(max(1, workers))]
+        self.threads = []
+        self.stopped = False
+
+    def shard_index(self, patient_id: str) -> int:
+        # crc32 e non hash(): stesso shard ad ogni avvio
+        return zlib.crc32(patient_id.encode()) % len(self.shards)
+
+    def start(self):
+        for index, shard in enumerate(self.shards):
+            thread = threading.Thread(target=self.run, args=(shard,), name=f"planner_worker_{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        """Ferma i worker dopo aver svuotato le code"""
+        self.stopped = True
+        for shard in self.shards:
+            with shard.condition:
+                shard.condition.notify()
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+
+    def submit(self, patient_id: str, message) -> bool:
+        """Accoda il messaggio senza bloccare; False se la coda dello shard e' piena"""
+        shard = self.shards[self.shard_index(patient_id)]
+        with shard.condition:
+            if patient_id in shard.pending:
+                shard.pending[patient_id] = message
+                shard.coalesced += 1
+                return True
+            if len(shard.pending) >= self.queue_size:
+                shard.dropped += 1
+                return False
+
+            shard.pending[patient_id] = message
+            shard.max_depth = max(shard.max_depth, len(shard.pending))
+            shard.condition.notify()
+        return True
+
+    def run(self, shard: Shard):
+        while True:
+            with shard.condition:
+                while not shard.pending and not self.stopped:
+                    shard.condition.wait()
+                if not shard.pending:
+                    return
+                patient_id, message = shard.pending.popitem(last=False)
+
+            try:
+                self.handler(patient_id, message)
+            except Exception as e:
+                print(f"[PLANNER] Error processing symptoms for patient {patient_id}: {e}")
+
+            with shard.condition:
+                shard.processed += 1
+
+    def stats(self) -> list[dict]:
+        """Per shard: pazienti in coda ora e al massimo, messaggi elaborati, sostituiti e scartati dall'ultima chiamata"""
+        stats = []
+        for index, shard in enumerate(self.shards):
+            with shard.condition:
+                stats.append({
+                    "shard": index,
+                    "depth": len(shard.pending),
+                    "max_depth": shard.max_depth,
+                    "processed": shard.processed,
+                    "coalesced": shard.coalesced,
+                    "dropped": shard.dropped
+                })
+                shard.max_depth = len(shard.pending)
+                shard.processed = shard.coalesced = shard.dropped = 0
+        return stats
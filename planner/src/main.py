@@ -1,8 +1,11 @@
 from handlers.mqtt_handler import MQTTHandler
 from planner_manager import PlannerManager
+from dispatcher import SymptomDispatcher
+from state_store import PlannerStateStore, StateWriter
 import json
 import time
 import os
+from pathlib import Path
 
 SYMPTOMS_TOPICS_PREFIX = os.getenv("SYMPTOMS_TOPICS_PREFIX")
 THERAPIES_TOPICS_PREFIX = os.getenv("THERAPIES_TOPICS_PREFIX")
@@ -10,31 +13,99 @@ THERAPIES_TOPICS_PREFIX = os.getenv("THERAPIES_TOPICS_PREFIX")
 MQTT_USERNAME = os.getenv("MQTT_USER")
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD")
 
+# esecuzione: "inline" (terapia calcolata e pubblicata nel thread di rete di paho)
+# oppure "workers" (on_message accoda, PLANNER_WORKERS thread elaborano)
+EXECUTION = os.getenv("PLANNER_EXECUTION", "inline")
+WORKERS = int(os.getenv("PLANNER_WORKERS", 4))
+QUEUE_SIZE = int(os.getenv("PLANNER_QUEUE_SIZE", 1000))
+
+# modalita' workers: statistiche delle code pubblicate su acrss/planner/queues/{shard}
+# ogni PLANNER_METRICS_SECONDS secondi (0 = disattivate)
+METRICS_SECONDS = float(os.getenv("PLANNER_METRICS_SECONDS", 10))
+METRICS_TOPICS_PREFIX = os.getenv("PLANNER_METRICS_TOPICS_PREFIX", "acrss/planner/queues")
+
+# stato dei planner su SQLite, scritto ogni PLANNER_STATE_FLUSH_SECONDS secondi
+# (0 = solo in memoria); al piu' PLANNER_MAX_PLANNERS planner in memoria,
+# rimossi dopo PLANNER_IDLE_SECONDS secondi senza messaggi
+STATE_PATH = os.getenv(
+    "PLANNER_STATE_PATH",
+    str(Path(__file__).resolve().parent.parent / "state" / "planners.db")
+)
+STATE_FLUSH_SECONDS = float(os.getenv("PLANNER_STATE_FLUSH_SECONDS", 1))
+MAX_PLANNERS = int(os.getenv("PLANNER_MAX_PLANNERS", 10000))
+IDLE_SECONDS = float(os.getenv("PLANNER_IDLE_SECONDS", 3600))
+
+
+# ultimo numero di sequenza ricevuto dall'analyzer per paziente
+last_seq = {}
+
+
+def check_sequence(patient_id, seq):
+    """Segnala i messaggi di sintomi persi (seq riparte da 1 al riavvio dell'analyzer)"""
+    if seq is None:
+        return
+    previous = last_seq.get(patient_id)
+    last_seq[patient_id] = seq
+    if previous is not None and seq > previous + 1:
+        print(f"[PLANNER] Missed {seq - previous - 1} symptom messages for patient {patient_id}")
+
+
+def plan(client, patient_id, payload):
+    therapy = PlannerManager.process_symptoms(patient_id, payload)
+
+    topic_out = f"{THERAPIES_TOPICS_PREFIX}/{patient_id}"
+
+    MQTTHandler.publish(
+        client,
+        (topic_out, therapy)
+    )
+
+    print(f"[PLANNER] Therapy published for patient {patient_id}")
+
 
 def on_message(client, userdata, message):
-    
+
     try:
         topic = message.topic
         payload = json.loads(message.payload.decode())
 
         patient_id = topic.split("/")[-1]
+        check_sequence(patient_id, payload.get("seq"))
+
+        dispatcher = userdata.get("dispatcher")
+        if dispatcher is None:
+            plan(client, patient_id, payload)
+        elif not dispatcher.submit(patient_id, payload):
+            print(f"[PLANNER] Queue full, symptoms dropped for patient {patient_id}")
 
-        therapy = PlannerManager.process_symptoms(patient_id, payload)
+    except Exception as e:
+        print("Planner error:", e)
 
-        topic_out = f"{THERAPIES_TOPICS_PREFIX}/{patient_id}"
 
-        MQTTHandler.publish(
-            client,
-            (topic_out, therapy)
-        )
+def publish_queue_stats(client, dispatcher):
+    for stats in dispatcher.stats():
+        MQTTHandler.publish(client, (f"{METRICS_TOPICS_PREFIX}/{stats['shard']}", stats))
 
-        print(f"[PLANNER] Therapy published for patient {patient_id}")
 
+def start_state_writer():
+    if STATE_FLUSH_SECONDS <= 0:
+        return None
+    try:
+        store = PlannerStateStore(STATE_PATH)
     except Exception as e:
-        print("Planner error:", e)
+        print(f"[PLANNER] Cannot open {STATE_PATH}, planner state will not be saved: {e}")
+        return None
+
+    PlannerManager.open_store(store, max_planners=MAX_PLANNERS, idle_seconds=IDLE_SECONDS)
+    writer = StateWriter(store, evict=PlannerManager.evict_idle, interval=STATE_FLUSH_SECONDS)
+    writer.start()
+    print(f"[PLANNER] Saving planner state to {STATE_PATH} every {STATE_FLUSH_SECONDS}s")
+    return writer
 
 
 def main():
+    state_writer = start_state_writer()
+
     mqtt_client = MQTTHandler.get_client(
         client_id="planner",
         username=MQTT_USERNAME,
@@ -42,14 +113,33 @@ def main():
         subscribe_topics=f"{SYMPTOMS_TOPICS_PREFIX}/+"
     )
 
+    dispatcher = None
+    if EXECUTION == "workers":
+        dispatcher = SymptomDispatcher(
+            lambda patient_id, payload: plan(mqtt_client, patient_id, payload),
+            workers=WORKERS,
+            queue_size=QUEUE_SIZE
+        )
+        dispatcher.start()
+        mqtt_client.user_data_get()["dispatcher"] = dispatcher
+        print(f"[PLANNER] Started {len(dispatcher.shards)} planner workers")
+
     MQTTHandler.set_on_message(mqtt_client, on_message)
     MQTTHandler.connect(mqtt_client, blocking = False)
 
     try:
+        last_stats = time.monotonic()
         while True:
             time.sleep(1)
+            if dispatcher is not None and METRICS_SECONDS > 0 and time.monotonic() - last_stats >= METRICS_SECONDS:
+                last_stats = time.monotonic()
+                publish_queue_stats(mqtt_client, dispatcher)
     except KeyboardInterrupt:
         mqtt_client.loop_stop()
+        if dispatcher is not None:
+            dispatcher.stop()
+        if state_writer is not None:
+            state_writer.stop()
         mqtt_client.disconnect()
 
 
@@ -1,9 +1,9 @@
 
-from datetime import datetime
-import copy
+import time
 
 class Planner():
     def __init__(self):
+        self.clock = time.time  # sorgente del tempo (epoch in secondi), virtuale nel replay
         self.therapy = {
             'ox_therapy': 0, 
             'fluids': None, 
@@ -23,6 +23,25 @@ class Planner():
                                 }
         self.last_bb_incr = None 
         self.beta_blocking_target_dose = 10
+    def state(self) -> dict:
+        """Stato clinico del paziente, serializzabile in JSON (per PlannerStateStore)"""
+        therapy = dict(self.therapy)
+        therapy['alert'] = sorted(therapy['alert'])
+        return {
+            'therapy': therapy,
+            'bb_stopped_therapy': dict(self.bb_stopped_therapy),
+            'last_bb_incr': self.last_bb_incr,
+            'ox_active_therapy': self.ox_active_therapy
+        }
+
+    def restore_state(self, state: dict):
+        """Ripristina lo stato salvato da state()"""
+        self.therapy = dict(state['therapy'])
+        self.therapy['alert'] = set(self.therapy['alert'])
+        self.bb_stopped_therapy = dict(state['bb_stopped_therapy'])
+        self.last_bb_incr = state['last_bb_incr']
+        self.ox_active_therapy = state['ox_active_therapy']
+
     def restart_beta_blocking(self):
             self.therapy['carvedilolo_beta_blocking'] = self.bb_stopped_therapy['carvedilolo_beta_blocking'] 
             self.therapy['improve_beta_blocking'] = self.bb_stopped_therapy['improve_beta_blocking']
@@ -93,9 +112,9 @@ class Planner():
 
     def calculate_dt(self):
         if self.last_bb_incr is None:
-            self.last_bb_incr = int(datetime.now().timestamp())
+            self.last_bb_incr = int(self.clock())
 
-        return int(datetime.now().timestamp()) - int(self.last_bb_incr) > self.dt_incr
+        return int(self.clock()) - int(self.last_bb_incr) > self.dt_incr
 
     def ox_therapy(self, patient_state):
         pattern_decrease = "_DECREASE"
@@ -165,24 +184,24 @@ class Planner():
         # Gestione decremento bb
         if status['heart_rate'] == 'STABLE_HR' and trend.get('hr') != 'IMPROVING':
             if self.therapy['improve_beta_blocking'] > 0 and self.calculate_dt():
-                self.last_bb_incr = int(datetime.now().timestamp())
+                self.last_bb_incr = int(self.clock())
                 self.therapy['improve_beta_blocking'] -= self.INCR_BB_DOSE
                 #print(f"Beta-bloccante diminuito a {self.therapy['improve_beta_blocking']}")
             if self.therapy['improve_beta_blocking'] == 0 and self.therapy['carvedilolo_beta_blocking'] == self.STARTING_BB_DOSE:
                 if self.calculate_dt():
-                    self.last_bb_incr = int(datetime.now().timestamp())
+                    self.last_bb_incr = int(self.clock())
                     self.therapy['carvedilolo_beta_blocking'] -= self.INCR_BB_DOSE
                     #print(f"Beta-bloccante base diminuito a {self.therapy['carvedilolo_beta_blocking']}")
         # Gestione incremento bb
         elif status['heart_rate'] == 'PRIMARY_TACHYCARDIA':
                 if trend['hr'] == 'STABLE' and self.therapy['carvedilolo_beta_blocking'] == 0:
-                    self.last_bb_incr = int(datetime.now().timestamp())
+                    self.last_bb_incr = int(self.clock())
                     self.therapy['carvedilolo_beta_blocking'] = self.STARTING_BB_DOSE
                     #print(f"Beta-bloccante dose iniziale a {self.therapy['carvedilolo_beta_blocking']} mg (PRIMARY_TACHYCARDIA - STABLE)")
                 elif trend['hr'] == 'INCREASING' and intensity['hr'] == 'STRONG_INCREASE' and (self.therapy['carvedilolo_beta_blocking'] + self.therapy['improve_beta_blocking']) <= self.beta_blocking_target_dose:
                     #print("è dentro il ramo che controlla se incrementare o aggiungere la dose base \n diff time verifica:", self.calculate_dt())
                     if self.calculate_dt():
-                        self.last_bb_incr = int(datetime.now().timestamp())
+                        self.last_bb_incr = int(self.clock())
                         if self.therapy['carvedilolo_beta_blocking'] == 1.25:
                             self.therapy['improve_beta_blocking'] += self.INCR_BB_DOSE
                             #print(f"Beta-bloccante aumentato a {self.therapy['improve_beta_blocking']} mg (PRIMARY_TACHYCARDIA - DETERIORATING)")
@@ -230,7 +249,8 @@ class Planner():
 
 
     def get_serializable_therapy(self):
-        therapy = copy.deepcopy(self.therapy)
+        # copia superficiale: l'unico valore mutabile, alert, diventa una nuova lista
+        therapy = dict(self.therapy)
         therapy['carvedilolo_beta_blocking']+= therapy['improve_beta_blocking']
         therapy.pop('improve_beta_blocking')
         therapy['alert'] = list(therapy['alert'])
@@ -1,25 +1,82 @@
-from datetime import datetime
-from typing import Dict
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from planner import Planner
+import decision_table
+
+# "rules" (metodi di Planner) oppure "table" (decisioni memorizzate in decision_table,
+# opzionale: non e' piu' veloce delle regole)
+PLANNER_ENGINE = os.getenv("PLANNER_ENGINE", "rules")
 
 
 class PlannerManager:
     """
     Gestisce un'istanza di Planner per ogni paziente.
     Garantisce stato clinico persistente e isolamento per patient_id.
+
+    Con uno store (open_store) lo stato di ogni paziente viene salvato dopo
+    ogni messaggio e ricaricato al primo messaggio dopo un riavvio o uno
+    sfratto; i Planner in memoria sono al piu' max_planners (i meno usati
+    escono per primi) e quelli inattivi da idle_seconds vengono rimossi.
     """
 
-    _planners: Dict[str, Planner] = {}
+    _planners: "OrderedDict[str, Planner]" = OrderedDict()  # dal meno al piu' recentemente usato
+    _last_used: dict[str, float] = {}
+    _lock = threading.Lock()
+
+    store = None
+    max_planners: int | None = None
+    idle_seconds: float | None = None
+
+    @classmethod
+    def open_store(cls, store, max_planners: int | None = None, idle_seconds: float | None = None):
+        cls.store = store
+        cls.max_planners = max_planners
+        cls.idle_seconds = idle_seconds
 
     @classmethod
     def get_planner(cls, patient_id: str) -> Planner:
         """
         Ritorna il planner associato al paziente.
-        Se non esiste, lo crea.
+        Se non esiste, lo crea (con lo stato salvato, se c'e').
         """
-        if patient_id not in cls._planners:
-            cls._planners[patient_id] = Planner()
-        return cls._planners[patient_id]
+        with cls._lock:
+            planner = cls._planners.get(patient_id)
+            if planner is None:
+                planner = Planner()
+                state = cls.store.load(patient_id) if cls.store is not None else None
+                if state is not None:
+                    planner.restore_state(state)
+                cls._planners[patient_id] = planner
+            else:
+                cls._planners.move_to_end(patient_id)
+            cls._last_used[patient_id] = time.monotonic()
+
+            if cls.max_planners is not None:
+                while len(cls._planners) > cls.max_planners:
+                    cls._evict_oldest()
+            return planner
+
+    @classmethod
+    def evict_idle(cls) -> int:
+        """Rimuove i planner non usati da idle_seconds; restituisce quanti"""
+        if cls.idle_seconds is None:
+            return 0
+        limit = time.monotonic() - cls.idle_seconds
+        evicted = 0
+        with cls._lock:
+            while cls._planners and cls._last_used[next(iter(cls._planners))] < limit:
+                cls._evict_oldest()
+                evicted += 1
+        return evicted
+
+    @classmethod
+    def _evict_oldest(cls):
+        # lo stato e' gia' nello store (stage dopo ogni messaggio)
+        patient_id, _ = cls._planners.popitem(last=False)
+        del cls._last_used[patient_id]
 
     @classmethod
     def process_symptoms(cls, patient_id: str, patient_state: dict) -> dict:
@@ -30,14 +87,20 @@ class PlannerManager:
         planner = cls.get_planner(patient_id)
 
         # ---- LOGICA CLINICA ----
-        planner.handle_beta_blocking(patient_state)
-        planner.stop_fluids(patient_state)
-        planner.fluids_escalation(patient_state)
-        planner.ox_therapy(patient_state)
-        planner.pharmacy_therapy(patient_state)
+        if PLANNER_ENGINE == "table":
+            decision_table.run(planner, patient_state)
+        else:
+            planner.handle_beta_blocking(patient_state)
+            planner.stop_fluids(patient_state)
+            planner.fluids_escalation(patient_state)
+            planner.ox_therapy(patient_state)
+            planner.pharmacy_therapy(patient_state)
+
+        if cls.store is not None:
+            cls.store.stage(patient_id, planner.state())
 
         therapy = planner.get_serializable_therapy()
-        therapy["timestamp"] = datetime.utcnow().isoformat()
+        # UTC senza offset, come il timestamp_format delle terapie in Telegraf
+        therapy["timestamp"] = datetime.fromtimestamp(planner.clock(), timezone.utc).replace(tzinfo=None).isoformat()
 
         return therapy
-
@@ -0,0 +1,115 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class PlannerStateStore:
+    """
+    Stato dei Planner su SQLite (WAL), una riga JSON per paziente.
+
+    Scrittura differita: stage() tiene in memoria l'ultimo stato di ogni
+    paziente e flush() li scrive tutti in una sola transazione. load()
+    legge prima gli stati non ancora scritti, poi il database.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS planners ("
+            "patient_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.lock = threading.Lock()  # connessione
+
+        self.pending: dict[str, dict] = {}
+        self.pending_lock = threading.Lock()
+
+    def stage(self, patient_id: str, state: dict):
+        with self.pending_lock:
+            self.pending[patient_id] = state
+
+    def load(self, patient_id: str) -> dict | None:
+        with self.pending_lock:
+            state = self.pending.get(patient_id)
+        if state is not None:
+            return state
+
+        with self.lock:
+            row = self.connection.execute("SELECT state FROM planners WHERE patient_id = ?", (patient_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def flush(self) -> int:
+        """Scrive gli stati in attesa; restituisce quanti"""
+        # gli stati restano in pending (e quindi visibili a load) fino al COMMIT
+        with self.pending_lock:
+            pending = dict(self.pending)
+        if not pending:
+            return 0
+
+        now = time.time()
+        rows = [(patient_id, json.dumps(state), now) for patient_id, state in pending.items()]
+        with self.lock:
+            try:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    "INSERT INTO planners (patient_id, state, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(patient_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                    rows
+                )
+                self.connection.execute("COMMIT")
+            except Exception:
+                if self.connection.in_transaction:
+                    self.connection.execute("ROLLBACK")
+                raise
+
+        # rimuove solo gli stati scritti, non quelli arrivati nel frattempo
+        with self.pending_lock:
+            for patient_id, state in pending.items():
+                if self.pending.get(patient_id) is state:
+                    del self.pending[patient_id]
+        return len(rows)
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.connection.close()
+
+
+class StateWriter:
+    """Scrive periodicamente gli stati in attesa e chiama evict() per liberare i Planner inattivi"""
+
+    def __init__(self, store: PlannerStateStore, evict=None, interval: float = 1):
+        self.store = store
+        self.evict = evict
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="planner_state_writer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Ferma il thread e scrive gli ultimi stati"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+            if self.evict is not None:
+                self.evict()
+
+    def flush(self):
+        try:
+            self.store.flush()
+        except Exception as e:
+            print(f"[PLANNER] Error writing planner state to {self.store.path}: {e}")
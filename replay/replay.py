@@ -0,0 +1,221 @@
+"""
+Replay offline del ciclo Analyzer -> Planner su parametri vitali registrati.
+
+Legge una registrazione (CSV esportato da Influx, CSV o Parquet), la fa
+scorrere paziente per paziente sotto un orologio virtuale e scrive i
+sintomi dell'Analyzer e le terapie del Planner in JSON Lines:
+
+    <output>/symptoms/<patient_id>.jsonl
+    <output>/therapies/<patient_id>.jsonl
+
+Nessun broker ne' Influx: il tempo avanza di --tick secondi per ciclo
+senza attese, quindi il replay va alla velocita' della CPU.
+
+    python replay/replay.py recording.csv --output replay_out
+    python replay/replay.py recording.parquet --output replay_out --workers 8 --filter-mode incremental
+
+Formati accettati:
+    - CSV di Influx (anche con annotazioni #datatype): colonne _time, _value,
+      _field, sensor, patient_id, come i punti vitals_state scritti da Telegraf
+    - CSV del pivot dell'analyzer: _time, patient_id, hr_value, bp_value_sbp, ...
+    - CSV o Parquet wide: time, patient_id, hr, rr, spo2, sbp, dbp
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "analyzer" / "src"), str(ROOT / "planner" / "src")]
+
+SENSORS = ["hr", "rr", "spo2", "sbp", "dbp"]
+
+
+class VirtualClock:
+    """Orologio del replay: epoch in secondi, avanzato dal ciclo"""
+
+    def __init__(self, now: float = 0.0):
+        self.t = now
+
+    def now(self) -> float:
+        return self.t
+
+
+def configure(filter_mode: str | None, aggregation: str | None):
+    """Variabili lette all'import dai moduli dell'analyzer (nessuna connessione viene aperta)"""
+    os.environ.setdefault("MQTT_PORT", "1883")
+    os.environ.setdefault("MQTT_CLIENT_KEEPALIVE", "180")
+    os.environ["ANALYZER_CHECKPOINT_SECONDS"] = "0"
+    os.environ["ANALYZER_METRICS_SECONDS"] = "0"
+    if filter_mode:
+        os.environ["ANALYZER_FILTER_MODE"] = filter_mode
+    if aggregation:
+        os.environ["ANALYZER_AGGREGATION"] = aggregation
+
+
+def load_recording(path: Path):
+    """Registrazione come {patient_id: DataFrame wide} (indice time UTC, colonne SENSORS)"""
+    import pandas as pd
+    from influx_handler import wide_from_csv
+
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path)
+    else:
+        # wide_from_csv decodifica direttamente il formato del pivot
+        header = pd.read_csv(path, comment="#", nrows=0).columns
+        if "_value" not in header and any(c.endswith("_value") or "_value_" in c for c in header):
+            return wide_from_csv(path)
+        df = pd.read_csv(path, comment="#", dtype={"patient_id": str})
+
+    if "_value" in df.columns:
+        # formato lungo di Influx: una riga per (tempo, sensore, campo)
+        field = df["_field"].str.removeprefix("value").str.removeprefix("_")
+        df = df.assign(metric=field.where(field != "", df["sensor"]), time=df["_time"])
+        df = df.pivot_table(index=["patient_id", "time"], columns="metric", values="_value", aggfunc="last")
+        df = df.reset_index()
+
+    df["time"] = pd.to_datetime(df["time"], utc=True, format="ISO8601")
+    df["patient_id"] = df["patient_id"].astype(str)
+
+    return {
+        patient_id: patient.set_index("time").sort_index()[[c for c in SENSORS if c in patient.columns]]
+        for patient_id, patient in df.groupby("patient_id", sort=False)
+    }
+
+
+def replay_patient(patient_id: str, wide, output: Path, tick: float, window_minutes: float,
+                   warmup_minutes: float, verbose: bool) -> dict:
+    """Replay di un paziente: restituisce i contatori del replay"""
+    import numpy as np
+    from analyzer import Analyzer
+    from influx_handler import to_analyzer_frame
+    from planner_manager import PlannerManager
+    import main as analyzer_main
+
+    started = time.perf_counter()
+    clock = VirtualClock()
+    analyzer = Analyzer()
+    analyzer.clock = clock.now
+    planner = PlannerManager.get_planner(patient_id)
+    planner.clock = clock.now
+
+    times = wide.index.as_unit("ns").asi8
+    first, last = int(times[0]), int(times[-1])
+    window_ns = int(window_minutes * 60e9)
+
+    # baseline dai primi warmup_minutes di registrazione, come le statistiche di Influx in produzione
+    warmup_end = first + int(warmup_minutes * 60e9)
+    history = to_analyzer_frame(wide.iloc[:np.searchsorted(times, warmup_end, side="right")])
+    stats = history.select_dtypes(include=["float"])
+    if len(stats) < 2:
+        return {"patient_id": patient_id, "ticks": 0, "symptoms": 0, "therapies": 0, "seconds": 0.0}
+    analyzer.initialize_baseline_stats(stats.mean().to_dict(), stats.var().to_dict())
+    analyzer.par_initialized = True
+
+    symptoms = therapies = ticks = 0
+    (output / "symptoms").mkdir(parents=True, exist_ok=True)
+    (output / "therapies").mkdir(parents=True, exist_ok=True)
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+    with open(output / "symptoms" / f"{patient_id}.jsonl", "w") as symptoms_file, \
+            open(output / "therapies" / f"{patient_id}.jsonl", "w") as therapies_file, quiet:
+        for t_ns in range(warmup_end, last + 1, int(tick * 1e9)):
+            clock.t = t_ns / 1e9
+            ticks += 1
+
+            # finestra degli ultimi window_minutes, come WindowCache in produzione
+            lo = np.searchsorted(times, t_ns - window_ns, side="left")
+            hi = np.searchsorted(times, t_ns, side="right")
+            raw_data = to_analyzer_frame(wide.iloc[lo:hi]) if hi > lo else wide.iloc[0:0]
+
+            status_patient = analyzer_main.publishable(patient_id, analyzer_main.analyze(patient_id, analyzer, raw_data))
+            if status_patient is None:
+                continue
+
+            symptoms_file.write(json.dumps(status_patient) + "\n")
+            symptoms += 1
+
+            therapy = PlannerManager.process_symptoms(patient_id, status_patient)
+            therapies_file.write(json.dumps(therapy) + "\n")
+            therapies += 1
+
+    return {
+        "patient_id": patient_id,
+        "ticks": ticks,
+        "symptoms": symptoms,
+        "therapies": therapies,
+        "seconds": time.perf_counter() - started
+    }
+
+
+def replay_worker(args):
+    patient_id, wide, options = args
+    configure(options["filter_mode"], options["aggregation"])
+    return replay_patient(
+        patient_id,
+        wide,
+        options["output"],
+        options["tick"],
+        options["window_minutes"],
+        options["warmup_minutes"],
+        options["verbose"]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay of the analyzer and planner on recorded vitals")
+    parser.add_argument("recording", type=Path, help="Influx CSV export, CSV or Parquet file")
+    parser.add_argument("--output", type=Path, default=Path("replay_out"))
+    parser.add_argument("--patients", help="comma separated patient ids (default: all)")
+    parser.add_argument("--tick", type=float, default=1, help="virtual seconds between analysis cycles")
+    parser.add_argument("--window-minutes", type=float, default=5, help="analysis window, as in production")
+    parser.add_argument("--warmup-minutes", type=float, default=5, help="recording used to initialize the baseline")
+    parser.add_argument("--workers", type=int, default=1, help="processes replaying patients in parallel")
+    parser.add_argument("--filter-mode", choices=["batch", "rows", "incremental"], help="ANALYZER_FILTER_MODE")
+    parser.add_argument("--aggregation", choices=["rolling", "frame"], help="ANALYZER_AGGREGATION")
+    parser.add_argument("--verbose", action="store_true", help="keep the analyzer's log lines")
+    args = parser.parse_args()
+
+    configure(args.filter_mode, args.aggregation)
+    recording = load_recording(args.recording)
+    if args.patients:
+        wanted = set(args.patients.split(","))
+        recording = {p: wide for p, wide in recording.items() if p in wanted}
+    if not recording:
+        print(f"No patients found in {args.recording}")
+        sys.exit(1)
+
+    options = {
+        "output": args.output,
+        "tick": args.tick,
+        "window_minutes": args.window_minutes,
+        "warmup_minutes": args.warmup_minutes,
+        "filter_mode": args.filter_mode,
+        "aggregation": args.aggregation,
+        "verbose": args.verbose
+    }
+    jobs = [(patient_id, wide, options) for patient_id, wide in recording.items()]
+
+    started = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(replay_worker, jobs))
+    else:
+        results = [replay_worker(job) for job in jobs]
+    elapsed = time.perf_counter() - started
+
+    for result in results:
+        print(f"[{result['patient_id']}] {result['ticks']} cycles, {result['symptoms']} symptoms in {result['seconds']:.1f}s")
+
+    ticks = sum(result["ticks"] for result in results)
+    print(f"Replayed {ticks} cycles for {len(results)} patients in {elapsed:.1f}s "
+          f"({ticks * args.tick / max(elapsed, 1e-9):.0f} virtual patient-seconds per second), output in {args.output}")
+
+
+if __name__ == "__main__":
+    main()